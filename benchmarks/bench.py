@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+"""Benchmark suite for vsyspy hot paths.
+
+usage: python benchmarks/bench.py [--filter=<substr>] [--output=<file>] [--compare=<file>] [--repeat=<n>]
+
+Micro-benchmarks cover hashing, addresses, signing, tx building, contract
+parsing and DataEntry coding; macro-benchmarks drive Wrapper against a local
+stub node. Results are printed as JSON so runs of different commits can be
+compared with --compare.
+"""
+
+__copyright__ = "Copyright (C) 2019 Icerm"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vsyspy as vpy
+from vsyspy.contract import Contract, DataEntry, Type, contract_cache, data_entries_from_bytes, serialize_data
+from vsyspy.crypto import hashChain, sign
+from vsyspy.stubnode import StubNode
+
+DEFAULT_REPEAT = 5
+MACRO_REQUESTS = 2000
+MACRO_THREADS = 8
+TIMESTAMP = 1500000000000000000
+
+
+class NullWrapper(object):
+    """Wrapper stand-in that never touches the network, used to time tx building alone.
+    """
+    node_host = 'null'
+
+    def request(self, api, post_data='', timeout=None, pinned=False):
+        return {}
+
+
+def micro_benchmarks():
+    chain = vpy.Chain(vpy.TESTNET_CHAIN, vpy.TESTNET_CHAIN_ID, vpy.ADDRESS_VERSION, NullWrapper())
+    sender = vpy.Account(chain=chain, seed='vsyspy benchmark sender seed', nonce=0)
+    recipient = vpy.Account(chain=chain, seed='vsyspy benchmark recipient seed', nonce=0)
+    public_key = vpy.crypto.base58.b58decode(sender.publicKey)
+    message = b'\x02' * 100
+    contract = vpy.default_contract()
+    contract_bytes = contract.bytes
+    contract_id = 'CF9Kb5hJ8Dp4z2EGo4L7eCkSeQ6S5EZzR9r'
+    data_stack = [DataEntry(recipient.address, Type.address), DataEntry(100000000, Type.amount)]
+    data_stack_bytes = serialize_data(data_stack)
+    lease_id = '8qbHbw2BbbTHBW1sbeqakYXVKRQM8Ne7pLK7m6CVfeR'
+
+    def parse_contract():
+        contract_cache.clear()
+        Contract().from_bytes(contract_bytes)
+
+    def contract_to_bytes():
+        contract.invalidate()
+        return contract.bytes
+
+    vpy.set_offline()
+    return [
+        ("crypto.hashChain", lambda: hashChain(message)),
+        ("crypto.sign", lambda: sign(sender.privateKey, message)),
+        ("chain.public_key_to_address", lambda: chain.public_key_to_address(public_key)),
+        ("chain.validate_address", lambda: chain.validate_address(recipient.address)),
+        ("tx.payment", lambda: sender.send_payment(recipient, 100000000, attachment='bench', timestamp=TIMESTAMP)),
+        ("tx.lease", lambda: sender.lease(recipient, 100000000, timestamp=TIMESTAMP)),
+        ("tx.cancel_lease", lambda: sender.cancel_lease(lease_id, timestamp=TIMESTAMP)),
+        ("tx.contend", lambda: sender.contend(1, timestamp=TIMESTAMP)),
+        ("tx.release", lambda: sender.release(1, timestamp=TIMESTAMP)),
+        ("tx.dbput", lambda: sender.dbput('key', 'value', timestamp=TIMESTAMP)),
+        ("tx.register_contract", lambda: sender.register_contract(contract, data_stack, timestamp=TIMESTAMP)),
+        ("tx.execute_contract", lambda: sender.execute_contract(contract_id, 3, data_stack, timestamp=TIMESTAMP)),
+        ("contract.from_bytes", parse_contract),
+        ("contract.bytes", contract_to_bytes),
+        ("data_entry.encode", lambda: serialize_data([DataEntry(recipient.address, Type.address),
+                                                      DataEntry(100000000, Type.amount)])),
+        ("data_entry.decode", lambda: [entry.data for entry in data_entries_from_bytes(data_stack_bytes)]),
+    ]
+
+
+def run_micro(name, func, repeat):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    timings = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    timings.sort()
+    return {"name": name, "kind": "micro", "iterations": number * repeat,
+            "best_us": timings[0] * 1e6, "median_us": timings[len(timings) // 2] * 1e6}
+
+
+def run_macro():
+    node = StubNode(block_interval=0).start()
+    try:
+        wrapper = vpy.Wrapper(node.node_host)
+        # identical concurrent GETs would be coalesced, every request must reach the node to compare runs
+        wrapper.coalesce_reads = False
+        latencies = []
+        lock = threading.Lock()
+        per_thread = MACRO_REQUESTS // MACRO_THREADS
+
+        def worker():
+            local = []
+            for _ in range(per_thread):
+                start = time.perf_counter()
+                wrapper.request('blocks/height')
+                local.append(time.perf_counter() - start)
+            with lock:
+                latencies.extend(local)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(MACRO_THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        node.stop()
+    latencies.sort()
+    return {"name": "wrapper.request.throughput", "kind": "macro", "iterations": len(latencies),
+            "requests_per_s": len(latencies) / elapsed,
+            "p50_us": latencies[len(latencies) // 2] * 1e6,
+            "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = dict((r["name"], r) for r in json.load(f)["results"])
+    for result in results:
+        old = baseline.get(result["name"])
+        key = "median_us" if result["kind"] == "micro" else "p50_us"
+        if old and old.get(key):
+            sys.stderr.write("%-32s %12.2f -> %12.2f us  (x%.2f)\n"
+                             % (result["name"], old[key], result[key], result[key] / old[key]))
+
+
+def main(argv):
+    options = dict(arg.lstrip('-').split('=', 1) for arg in argv if '=' in arg)
+    name_filter = options.get('filter', '')
+    repeat = int(options.get('repeat', DEFAULT_REPEAT))
+    results = [run_micro(name, func, repeat) for name, func in micro_benchmarks() if name_filter in name]
+    if name_filter in "wrapper.request.throughput":
+        results.append(run_macro())
+    report = {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+              "results": results}
+    output = json.dumps(report, indent=2)
+    if options.get('output'):
+        with open(options['output'], 'w') as f:
+            f.write(output)
+    print(output)
+    if options.get('compare'):
+        compare(results, options['compare'])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
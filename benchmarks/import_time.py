@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""Import-time regression benchmark for vsyspy.
+
+usage: python benchmarks/import_time.py [--budget-ms=<ms>] [--runs=<n>]
+
+Imports vsyspy in fresh interpreters and fails when the median import time
+exceeds the budget or when a lazily loaded dependency is imported eagerly.
+"""
+
+__copyright__ = "Copyright (C) 2019 Icerm"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+
+import json
+import os
+import subprocess
+import sys
+
+DEFAULT_BUDGET_MS = 60
+DEFAULT_RUNS = 7
+
+# modules that must not be loaded by a bare ``import vsyspy``
+LAZY_MODULES = ['requests', 'pyblake2', 'axolotl_curve25519', 'vsyspy.words', 'numpy', 'sqlite3',
+                'concurrent.futures.process', 'multiprocessing']
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import vsyspy
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed * 1000, [m for m in %r if m in sys.modules]]))
+""" % (LAZY_MODULES,)
+
+
+def measure(runs=DEFAULT_RUNS):
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join([root, env.get('PYTHONPATH', '')])
+    timings, eager = [], set()
+    for _ in range(runs):
+        out = subprocess.check_output([sys.executable, '-c', PROBE], env=env)
+        elapsed_ms, loaded = json.loads(out.decode().strip().splitlines()[-1])
+        timings.append(elapsed_ms)
+        eager.update(loaded)
+    timings.sort()
+    return {"benchmark": "import_vsyspy", "runs": runs, "median_ms": timings[len(timings) // 2],
+            "min_ms": timings[0], "max_ms": timings[-1], "eager_modules": sorted(eager)}
+
+
+def main(argv):
+    options = dict(arg.lstrip('-').split('=', 1) for arg in argv if '=' in arg)
+    budget = float(options.get('budget-ms', DEFAULT_BUDGET_MS))
+    result = measure(int(options.get('runs', DEFAULT_RUNS)))
+    result["budget_ms"] = budget
+    print(json.dumps(result))
+    if result["eager_modules"]:
+        sys.stderr.write("Eagerly imported: %s\n" % ', '.join(result["eager_modules"]))
+        return 1
+    if result["median_ms"] > budget:
+        sys.stderr.write("Import time %.1f ms is over the %.1f ms budget\n" % (result["median_ms"], budget))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
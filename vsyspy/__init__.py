@@ -31,6 +31,8 @@ VSYSPY is a recursive acronym for V SYStems Python.
 from vsyspy.setting import *
 
 import logging
+import threading
+from contextlib import contextmanager
 
 console = logging.StreamHandler()
 console.setLevel(logging.ERROR)
@@ -52,11 +54,30 @@ def set_online():
     OFFLINE = False
 
 
+_mode = threading.local()
+
+
 def is_offline():
-    global OFFLINE
+    offline = getattr(_mode, 'offline', None)
+    if offline is not None:
+        return offline
     return OFFLINE
 
 
+@contextmanager
+def offline_mode(offline=True):
+    """Overrides the process wide offline flag in the current thread only.
+
+    Chains with their own ``offline`` setting are not affected.
+    """
+    previous = getattr(_mode, 'offline', None)
+    _mode.offline = offline
+    try:
+        yield
+    finally:
+        _mode.offline = previous
+
+
 from vsyspy.wrapper import Wrapper
 
 
@@ -67,11 +88,23 @@ def create_api_wrapper(node_host=DEFAULT_NODE, api_key=DEFAULT_API_KEY):
 from .chain import Chain
 
 
-def testnet_chain(api_wrapper=create_api_wrapper(DEFAULT_TESTNET_NODE, DEFAULT_TESTNET_API_KEY)):
+_default_wrappers = {}
+
+
+def _default_wrapper(node_host, api_key):
+    # created on first use and then shared, as the old default arguments were
+    if node_host not in _default_wrappers:
+        _default_wrappers[node_host] = create_api_wrapper(node_host, api_key)
+    return _default_wrappers[node_host]
+
+
+def testnet_chain(api_wrapper=None):
+    api_wrapper = api_wrapper or _default_wrapper(DEFAULT_TESTNET_NODE, DEFAULT_TESTNET_API_KEY)
     return Chain(TESTNET_CHAIN, TESTNET_CHAIN_ID, ADDRESS_VERSION, api_wrapper)
 
 
-def default_chain(api_wrapper=create_api_wrapper()):
+def default_chain(api_wrapper=None):
+    api_wrapper = api_wrapper or _default_wrapper(DEFAULT_NODE, DEFAULT_API_KEY)
     return Chain(DEFAULT_CHAIN, DEFAULT_CHAIN_ID, ADDRESS_VERSION, api_wrapper)
 
 
@@ -84,5 +117,5 @@ def default_contract(con_dts=Contract_Permitted_Without_Split):
 
 
 __all__ = [
-    'Account', 'Chain', 'Wrapper', 'Contract', 'DataEntry', 'is_offline'
+    'Account', 'Chain', 'Wrapper', 'Contract', 'DataEntry', 'is_offline', 'offline_mode'
 ]
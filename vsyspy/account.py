@@ -27,15 +27,20 @@ __doc__ = """
 from .errors import *
 from .setting import *
 from .crypto import *
-from .words import WORDS
 from .contract import serialize_data
-from . import is_offline, default_chain
+from .transaction import payment_bytes, lease_bytes, cancel_lease_bytes, slot_bytes, dbput_bytes, \
+    register_contract_bytes, execute_contract_bytes
+from .tracing import span
+from .pending import PendingTxIndex
+from . import default_chain
 
-import struct
 import time
 import json
 import base58
 import logging
+import threading
+
+_pending_lock = threading.Lock()
 
 
 class Account(object):
@@ -67,12 +72,23 @@ class Account(object):
 
         nonce of address.
 
+    .. attribute:: pending
+
+        PendingTxIndex of broadcast transactions not confirmed yet, keyed by their locally computed id.
+        Created on first use unless one is passed in. The default one keeps at most
+        DEFAULT_PENDING_SIZE entries for at most DEFAULT_PENDING_MAX_AGE seconds.
+
+    Offline mode follows ``chain.is_offline()``. Accounts hold no mutable state
+    after construction apart from ``pending``, which is thread safe, so one
+    account can sign and broadcast from many threads.
+
     """
-    def __init__(self, chain=default_chain(), address='', public_key='', private_key='', seed='', nonce=0):
+    def __init__(self, chain=None, address='', public_key='', private_key='', seed='', nonce=0, pending=None):
         """Constructor.
         """
-        self.chain = chain
-        self.wrapper = chain.api_wrapper
+        self.chain = chain or default_chain()
+        self.wrapper = self.chain.api_wrapper
+        self._pending = pending
         if nonce < 0 or nonce > MAX_NONCE:
             raise InvalidParameterException('Nonce must be between 0 and %d' % MAX_NONCE)
         if seed:
@@ -94,6 +110,14 @@ class Account(object):
             self._generate(nonce=nonce)
         self.logger = logging.getLogger(__name__)
 
+    @property
+    def pending(self):
+        if self._pending is None:
+            with _pending_lock:
+                if self._pending is None:
+                    self._pending = PendingTxIndex()
+        return self._pending
+
     def __str__(self):
         """Returns readable representation.
         """
@@ -101,7 +125,7 @@ class Account(object):
             raise InvalidAddressException("No address")
         result = 'address = %s\npublicKey = %s\nprivateKey = %s\nseed = %s\nnonce = %d' % \
                  (self.address, self.publicKey, self.privateKey, self.seed, self.nonce)
-        if not is_offline():
+        if not self.chain.is_offline():
             try:
                 balance = self.balance()
                 result += "\nbalance: {}".format(balance)
@@ -112,7 +136,7 @@ class Account(object):
     __repr__ = __str__
 
     def balance(self, confirmations=0):
-        if is_offline():
+        if self.chain.is_offline():
             raise NetworkException("Cannot check height in offline mode.")
         try:
             confirmations_str = '' if confirmations == 0 else '/%d' % confirmations
@@ -136,6 +160,7 @@ class Account(object):
         self.seed = seed
         self.nonce = nonce
         if not public_key and not private_key and not seed:
+            from .words import WORDS
             wordCount = 2048
             words = []
             for i in range(5):
@@ -176,8 +201,8 @@ class Account(object):
             raise InvalidParameterException('Attachment length must be <= %d' % MAX_ATTACHMENT_SIZE)
         elif lease_id and len(base58.b58decode(lease_id)) != LEASE_TX_ID_BYTES:
             raise InvalidParameterException('Invalid lease transaction id')
-        elif slot_id and (slot_id >= 60 or slot_id < 0):
-            raise InvalidParameterException('Slot id must be in 0 to 59')
+        elif slot_id and (slot_id >= SLOT_COUNT or slot_id < 0):
+            raise InvalidParameterException('Slot id must be in 0 to %d' % (SLOT_COUNT - 1))
         elif db_key and (len(db_key) > MAX_DB_KEY_SIZE or len(db_key) < MIN_DB_KEY_SIZE):
             raise InvalidParameterException('DB key length must be greater than %d and smaller than %d'
                                             % (MIN_DB_KEY_SIZE, MAX_ATTACHMENT_SIZE))
@@ -185,7 +210,7 @@ class Account(object):
             raise InvalidParameterException('Transaction fee must be >= %d' % default_fee)
         elif CHECK_FEE_SCALE and fee_scale != DEFAULT_FEE_SCALE:
             raise InvalidParameterException('Wrong fee scale (currently, fee scale must be %d).' % DEFAULT_FEE_SCALE)
-        elif not is_offline() and amount and self.balance() < amount + tx_fee:
+        elif not self.chain.is_offline() and amount and self.balance() < amount + tx_fee:
             raise InsufficientBalanceException('Insufficient VSYS balance')
         else:
             return True
@@ -200,74 +225,63 @@ class Account(object):
         if self._check(tx_fee, fee_scale, address=recipient.address, amount=amount, attachment=attachment):
             if timestamp == 0:
                 timestamp = int(time.time() * 1000000000)
-            sData = struct.pack(">B", PAYMENT_TX_TYPE) + \
-                    struct.pack(">Q", timestamp) + \
-                    struct.pack(">Q", amount) + \
-                    struct.pack(">Q", tx_fee) + \
-                    struct.pack(">H", fee_scale) + \
-                    base58.b58decode(recipient.address) + \
-                    struct.pack(">H", len(attachment)) + \
-                    str2bytes(attachment)
+            with span('serialize'):
+                sData = payment_bytes(recipient.address, amount, str2bytes(attachment), tx_fee, fee_scale, timestamp)
             signature = bytes2str(sign(self.privateKey, sData))
             attachment_str = bytes2str(base58.b58encode(str2bytes(attachment)))
-            data = json.dumps({
-                "senderPublicKey": self.publicKey,
-                "recipient": recipient.address,
-                "amount": amount,
-                "fee": tx_fee,
-                "feeScale": fee_scale,
-                "timestamp": timestamp,
-                "attachment": attachment_str,
-                "signature": signature
-            })
-            return self.wrapper.request('vsys/broadcast/payment', data)
+            with span('json'):
+                data = json.dumps({
+                    "senderPublicKey": self.publicKey,
+                    "recipient": recipient.address,
+                    "amount": amount,
+                    "fee": tx_fee,
+                    "feeScale": fee_scale,
+                    "timestamp": timestamp,
+                    "attachment": attachment_str,
+                    "signature": signature
+                })
+            return self._broadcast('vsys/broadcast/payment', sData, timestamp, data)
 
     def lease(self, recipient, amount, tx_fee=DEFAULT_LEASE_FEE, fee_scale=DEFAULT_FEE_SCALE, timestamp=0):
         if self._check(tx_fee, fee_scale, address=recipient.address, amount=amount):
             if timestamp == 0:
                 timestamp = int(time.time() * 1000000000)
-            sData = struct.pack(">B", LEASE_TX_TYPE) + \
-                    base58.b58decode(recipient.address) + \
-                    struct.pack(">Q", amount) + \
-                    struct.pack(">Q", tx_fee) + \
-                    struct.pack(">H", fee_scale) + \
-                    struct.pack(">Q", timestamp)
+            with span('serialize'):
+                sData = lease_bytes(recipient.address, amount, tx_fee, fee_scale, timestamp)
             signature = bytes2str(sign(self.privateKey, sData))
-            data = json.dumps({
-                "senderPublicKey": self.publicKey,
-                "recipient": recipient.address,
-                "amount": amount,
-                "fee": tx_fee,
-                "feeScale": fee_scale,
-                "timestamp": timestamp,
-                "signature": signature
-            })
-            return self.wrapper.request('leasing/broadcast/lease', data)
+            with span('json'):
+                data = json.dumps({
+                    "senderPublicKey": self.publicKey,
+                    "recipient": recipient.address,
+                    "amount": amount,
+                    "fee": tx_fee,
+                    "feeScale": fee_scale,
+                    "timestamp": timestamp,
+                    "signature": signature
+                })
+            return self._broadcast('leasing/broadcast/lease', sData, timestamp, data)
 
     def cancel_lease(self, lease_id, tx_fee=DEFAULT_CANCEL_LEASE_FEE, fee_scale=DEFAULT_FEE_SCALE, timestamp=0):
         if self._check(tx_fee, fee_scale, amount=0, lease_id=lease_id):
             if timestamp == 0:
                 timestamp = int(time.time() * 1000000000)
-            sData = struct.pack(">B", LEASE_CANCEL_TX_TYPE) + \
-                    struct.pack(">Q", tx_fee) + \
-                    struct.pack(">H", fee_scale) + \
-                    struct.pack(">Q", timestamp) + \
-                    base58.b58decode(lease_id)
+            with span('serialize'):
+                sData = cancel_lease_bytes(lease_id, tx_fee, fee_scale, timestamp)
             signature = bytes2str(sign(self.privateKey, sData))
-            data = json.dumps({
-                "senderPublicKey": self.publicKey,
-                "txId": lease_id,
-                "fee": tx_fee,
-                "feeScale": fee_scale,
-                "timestamp": timestamp,
-                "signature": signature
-            })
-            req = self.wrapper.request('leasing/broadcast/cancel', data)
-            return req
+            with span('json'):
+                data = json.dumps({
+                    "senderPublicKey": self.publicKey,
+                    "txId": lease_id,
+                    "fee": tx_fee,
+                    "feeScale": fee_scale,
+                    "timestamp": timestamp,
+                    "signature": signature
+                })
+            return self._broadcast('leasing/broadcast/cancel', sData, timestamp, data)
 
     def contend(self, slot_id, tx_fee=DEFAULT_CONTEND_SLOT_FEE, fee_scale=DEFAULT_FEE_SCALE, timestamp=0):
         if self._check(tx_fee, fee_scale, slot_id=slot_id, default_fee=DEFAULT_CONTEND_SLOT_FEE):
-            if not is_offline():
+            if not self.chain.is_offline():
                 balance_detail = self.get_info()
                 min_effective_balance = MIN_CONTEND_SLOT_BALANCE + tx_fee
                 if balance_detail["effective"] < min_effective_balance:
@@ -282,41 +296,37 @@ class Account(object):
                         'to yours. You will fail in contending this slot.' % slot_id)
             if timestamp == 0:
                 timestamp = int(time.time() * 1000000000)
-            sData = struct.pack(">B", CONTEND_SLOT_TX_TYPE) + \
-                    struct.pack(">I", slot_id) + \
-                    struct.pack(">Q", tx_fee) + \
-                    struct.pack(">H", fee_scale) + \
-                    struct.pack(">Q", timestamp)
+            with span('serialize'):
+                sData = slot_bytes(CONTEND_SLOT_TX_TYPE, slot_id, tx_fee, fee_scale, timestamp)
             signature = bytes2str(sign(self.privateKey, sData))
-            data = json.dumps({
-                "senderPublicKey": self.publicKey,
-                "fee": tx_fee,
-                "feeScale": fee_scale,
-                "slotId": slot_id,
-                "timestamp": timestamp,
-                "signature": signature
-            })
-            return self.wrapper.request('spos/broadcast/contend', data)
+            with span('json'):
+                data = json.dumps({
+                    "senderPublicKey": self.publicKey,
+                    "fee": tx_fee,
+                    "feeScale": fee_scale,
+                    "slotId": slot_id,
+                    "timestamp": timestamp,
+                    "signature": signature
+                })
+            return self._broadcast('spos/broadcast/contend', sData, timestamp, data)
 
     def release(self, slot_id, tx_fee=DEFAULT_RELEASE_SLOT_FEE, fee_scale=DEFAULT_FEE_SCALE, timestamp=0):
         if self._check(tx_fee, fee_scale, amount=0, slot_id=slot_id):
             if timestamp == 0:
                 timestamp = int(time.time() * 1000000000)
-            sData = struct.pack(">B", RELEASE_SLOT_TX_TYPE) + \
-                    struct.pack(">I", slot_id) + \
-                    struct.pack(">Q", tx_fee) + \
-                    struct.pack(">H", fee_scale) + \
-                    struct.pack(">Q", timestamp)
+            with span('serialize'):
+                sData = slot_bytes(RELEASE_SLOT_TX_TYPE, slot_id, tx_fee, fee_scale, timestamp)
             signature = bytes2str(sign(self.privateKey, sData))
-            data = json.dumps({
-                "senderPublicKey": self.publicKey,
-                "fee": tx_fee,
-                "feeScale": fee_scale,
-                "slotId": slot_id,
-                "timestamp": timestamp,
-                "signature": signature
-            })
-            return self.wrapper.request('spos/broadcast/release', data)
+            with span('json'):
+                data = json.dumps({
+                    "senderPublicKey": self.publicKey,
+                    "fee": tx_fee,
+                    "feeScale": fee_scale,
+                    "slotId": slot_id,
+                    "timestamp": timestamp,
+                    "signature": signature
+                })
+            return self._broadcast('spos/broadcast/release', sData, timestamp, data)
 
     def dbput(self, db_key, db_data, db_data_type="ByteArray", tx_fee=DEFAULT_DBPUT_FEE, fee_scale=DEFAULT_FEE_SCALE,
               timestamp=0):
@@ -329,95 +339,115 @@ class Account(object):
             # TODO: add more DB data type here
             else:
                 raise InvalidParameterException('Unsupported data type: {}'.format(db_data_type))
-            sData = struct.pack(">B", DBPUT_TX_TYPE) + \
-                    struct.pack(">H", len(db_key)) + \
-                    str2bytes(db_key) + \
-                    struct.pack(">H", len(db_data) + 1) + \
-                    data_type_id + \
-                    str2bytes(db_data) + \
-                    struct.pack(">Q", tx_fee) + \
-                    struct.pack(">H", fee_scale) + \
-                    struct.pack(">Q", timestamp)
+            with span('serialize'):
+                sData = dbput_bytes(str2bytes(db_key), str2bytes(db_data), data_type_id, tx_fee, fee_scale, timestamp)
             signature = bytes2str(sign(self.privateKey, sData))
-            data = json.dumps({
-                "senderPublicKey": self.publicKey,
-                "dbKey": db_key,
-                "dataType": db_data_type,
-                "data": db_data,
-                "fee": tx_fee,
-                "feeScale": fee_scale,
-                "timestamp": timestamp,
-                "signature": signature
-            })
-            return self.wrapper.request('database/broadcast/put', data)
+            with span('json'):
+                data = json.dumps({
+                    "senderPublicKey": self.publicKey,
+                    "dbKey": db_key,
+                    "dataType": db_data_type,
+                    "data": db_data,
+                    "fee": tx_fee,
+                    "feeScale": fee_scale,
+                    "timestamp": timestamp,
+                    "signature": signature
+                })
+            return self._broadcast('database/broadcast/put', sData, timestamp, data)
 
     def register_contract(self, contract, data_stack, description='', tx_fee=DEFAULT_REGISTER_CONTRACT_FEE,
                           fee_scale=DEFAULT_FEE_SCALE, timestamp=0):
         if self._check(tx_fee, fee_scale, amount=0, default_fee=DEFAULT_REGISTER_CONTRACT_FEE):
-            data_stack_bytes = serialize_data(data_stack)
             if timestamp == 0:
                 timestamp = int(time.time() * 1000000000)
-            sData = struct.pack(">B", REGISTER_CONTRACT_TX_TYPE) + \
-                    struct.pack(">H", len(contract.bytes)) + \
-                    contract.bytes + \
-                    struct.pack(">H", len(data_stack_bytes)) + \
-                    data_stack_bytes + \
-                    struct.pack(">H", len(description)) + \
-                    str2bytes(description) + \
-                    struct.pack(">Q", tx_fee) + \
-                    struct.pack(">H", fee_scale) + \
-                    struct.pack(">Q", timestamp)
+            with span('serialize'):
+                data_stack_bytes = serialize_data(data_stack)
+                sData = register_contract_bytes(contract.bytes, data_stack_bytes, str2bytes(description),
+                                                tx_fee, fee_scale, timestamp)
             signature = bytes2str(sign(self.privateKey, sData))
             description_str = description
             data_stack_str = bytes2str(base58.b58encode(data_stack_bytes))
-            data = json.dumps({
-                "senderPublicKey": self.publicKey,
-                "contract": bytes2str(base58.b58encode(contract.bytes)),
-                "initData": data_stack_str,
-                "description": description_str,
-                "fee": tx_fee,
-                "feeScale": fee_scale,
-                "timestamp": timestamp,
-                "signature": signature
-            })
-            return self.wrapper.request('contract/broadcast/register', data)
+            with span('json'):
+                data = json.dumps({
+                    "senderPublicKey": self.publicKey,
+                    "contract": contract.base58_string,
+                    "initData": data_stack_str,
+                    "description": description_str,
+                    "fee": tx_fee,
+                    "feeScale": fee_scale,
+                    "timestamp": timestamp,
+                    "signature": signature
+                })
+            return self._broadcast('contract/broadcast/register', sData, timestamp, data)
 
     def execute_contract(self, contract_id, func_id, data_stack, attachment='', tx_fee=DEFAULT_EXECUTE_CONTRACT_FEE,
                          fee_scale=DEFAULT_FEE_SCALE, timestamp=0):
         if self._check(tx_fee, fee_scale, amount=0, default_fee=DEFAULT_EXECUTE_CONTRACT_FEE):
-            data_stack_bytes = serialize_data(data_stack)
             if timestamp == 0:
                 timestamp = int(time.time() * 1000000000)
-            sData = struct.pack(">B", EXECUTE_CONTRACT_FUNCTION_TX_TYPE) + \
-                    base58.b58decode(contract_id) + \
-                    struct.pack(">H", func_id) + \
-                    struct.pack(">H", len(data_stack_bytes)) + \
-                    data_stack_bytes + \
-                    struct.pack(">H", len(attachment)) + \
-                    str2bytes(attachment) + \
-                    struct.pack(">Q", tx_fee) + \
-                    struct.pack(">H", fee_scale) + \
-                    struct.pack(">Q", timestamp)
+            with span('serialize'):
+                data_stack_bytes = serialize_data(data_stack)
+                sData = execute_contract_bytes(contract_id, func_id, data_stack_bytes, str2bytes(attachment),
+                                               tx_fee, fee_scale, timestamp)
             signature = bytes2str(sign(self.privateKey, sData))
             description_str = bytes2str(base58.b58encode(str2bytes(attachment)))
             data_stack_str = bytes2str(base58.b58encode(data_stack_bytes))
-            data = json.dumps({
-                "senderPublicKey": self.publicKey,
-                "contractId": contract_id,
-                "functionIndex": func_id,
-                "functionData": data_stack_str,
-                "attachment": description_str,
-                "fee": tx_fee,
-                "feeScale": fee_scale,
-                "timestamp": timestamp,
-                "signature": signature
-            })
-            return self.wrapper.request('contract/broadcast/execute', data)
+            with span('json'):
+                data = json.dumps({
+                    "senderPublicKey": self.publicKey,
+                    "contractId": contract_id,
+                    "functionIndex": func_id,
+                    "functionData": data_stack_str,
+                    "attachment": description_str,
+                    "fee": tx_fee,
+                    "feeScale": fee_scale,
+                    "timestamp": timestamp,
+                    "signature": signature
+                })
+            return self._broadcast('contract/broadcast/execute', sData, timestamp, data)
+
+    def _broadcast(self, api, sData, timestamp, data):
+        # the id is known before the node answers, so a broadcast that times out can still be looked up
+        tx_id = transaction_id(sData)
+        self.pending.add(tx_id, api, data, timestamp)
+        try:
+            resp = self.wrapper.request(api, data)
+        except NetworkException as e:
+            e.tx_id = tx_id
+            raise
+        if isinstance(resp, dict):
+            if resp.get('error'):
+                self.pending.remove(tx_id)
+            elif 'id' not in resp:
+                resp['id'] = tx_id
+            elif resp['id'] != tx_id:
+                self.logger.warning("Node returned tx id {} for local id {}".format(resp['id'], tx_id))
+        return resp
+
+    def rebroadcast(self, tx_id):
+        """Broadcasts a pending transaction again unless the node already has it.
+
+        Returns the node's tx json if it is known, otherwise the broadcast response.
+        """
+        self.check_is_offline()
+        entry = self.pending.get(tx_id)
+        if entry is None:
+            raise InvalidParameterException('Transaction {} is not pending'.format(tx_id))
+        for resp in (self.chain.unconfirmed_tx(tx_id), self.chain.tx(tx_id)):
+            if isinstance(resp, dict) and resp.get('id') == tx_id:
+                return resp
+        return self.wrapper.request(entry['api'], entry['data'])
+
+    def pending_in_utx(self, max_age=0):
+        """Tells for every tx in ``pending`` whether it is still in the UTX pool, from one pool snapshot.
+        """
+        self.check_is_offline()
+        return self.chain.pending_many([entry['id'] for entry in self.pending.items()], max_age)
 
     def get_info(self):
         if not (self.address and self.publicKey):
             raise MissingAddressException('Address and Public key required')
-        if is_offline():
+        if self.chain.is_offline():
             info = {
                 "publicKey": self.publicKey,
                 "address": self.address
@@ -431,7 +461,7 @@ class Account(object):
             return info
 
     def get_tx_history(self, limit=100, type_filter=PAYMENT_TX_TYPE):
-        if is_offline():
+        if self.chain.is_offline():
             raise NetworkException("Cannot check history in offline mode.")
         if not self.address:
             raise MissingAddressException('Address required')
@@ -444,13 +474,41 @@ class Account(object):
                 resp = [tx for tx in resp[0] if tx['type'] == type_filter]
             return resp
 
+    def iter_tx_history(self, type_filter=PAYMENT_TX_TYPE, page_size=DEFAULT_TX_HISTORY_PAGE_SIZE):
+        """Yields the address's transactions page by page, newest first.
+
+        Walks the node's offset based listing, so the whole history is reachable
+        while only one page is held in memory. The type filter is sent to the node.
+        """
+        if self.chain.is_offline():
+            raise NetworkException("Cannot check history in offline mode.")
+        if not self.address:
+            raise MissingAddressException('Address required')
+        elif page_size <= 0 or page_size > MAX_TX_HISTORY_LIMIT:
+            raise InvalidParameterException('Page size must be between 1 and %d.' % MAX_TX_HISTORY_LIMIT)
+        offset = 0
+        while True:
+            url = 'transactions/list?address={}&limit={}&offset={}'.format(self.address, page_size, offset)
+            if type_filter:
+                url += '&txType={}'.format(type_filter)
+            resp = self.wrapper.request(url)
+            txs = resp.get('transactions') if isinstance(resp, dict) else None
+            if txs is None:
+                raise NetworkException("Failed to get transaction history. ({})".format(resp))
+            for tx in txs:
+                if not type_filter or tx.get('type') == type_filter:
+                    yield tx
+            offset += len(txs)
+            if len(txs) < page_size or offset >= resp.get('totalCount', offset + 1):
+                return
+
     def check_tx(self, tx_id, confirmations=0):
         """Confirm tx on chain.
         Return True if Transaction is fully confirmed.
         Return False if Transaction is sent but not confirmed or failed.
         Return None if Transaction does not exist!
         """
-        if is_offline():
+        if self.chain.is_offline():
             raise NetworkException("Cannot check transaction in offline mode.")
         utx_res = self.chain.unconfirmed_tx(tx_id)
         if "id" in utx_res:
@@ -463,6 +521,7 @@ class Account(object):
                 cur_height = self.chain.height()
                 if cur_height >= tx_height + confirmations:
                     self.logger.debug("Transaction {} is fully confirmed.".format(tx_id))
+                    self.pending.remove(tx_id)
                     return True
                 else:
                     self.logger.info("Transaction {} is sent but not fully confirmed.".format(tx_id))
@@ -474,10 +533,11 @@ class Account(object):
             else:
                 self.logger.error("Transaction failed to process!")
                 self.logger.debug("Tx API response: {}".format(tx_res))
+                self.pending.remove(tx_id)
                 return False
 
     def check_node(self, other_node_host=None):
-        if is_offline():
+        if self.chain.is_offline():
             raise NetworkException("Cannot check transaction in offline mode.")
         if other_node_host:
             res = self.chain.check_with_other_node(other_node_host)
@@ -510,7 +570,6 @@ class Account(object):
         else:
             return False
 
-    @staticmethod
-    def check_is_offline():
-        if is_offline():
+    def check_is_offline(self):
+        if self.chain.is_offline():
             raise NetworkException("Cannot check transaction in offline mode.")
@@ -0,0 +1,124 @@
+__copyright__ = "Copyright (C) 2019 Icerm"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+__doc__ = """
+:mod:`vsyspy.cassette` record and replay of Wrapper traffic.
+"""
+
+from .errors import NetworkException, InvalidParameterException
+
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict, deque
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+ORIGINAL_PACING = 'original'
+FAST_PACING = 'fast'
+
+
+class Cassette(object):
+    """Class for Cassette.
+
+    In record mode every request made through a Wrapper is appended to a
+    gzipped JSON lines file together with its response and latency. In replay
+    mode the recorded responses are served back in order, either after the
+    recorded latency or immediately.
+
+    GET requests are matched by api path. POST requests are matched by api path
+    only, because signatures differ on every run. Once the recordings of a
+    request run out, its last response keeps being served.
+
+    .. attribute:: path
+
+        cassette file path.
+
+    .. attribute:: mode
+
+        'record' or 'replay'.
+
+    .. attribute:: pacing
+
+        'original' to replay with the recorded latency, 'fast' to replay at once.
+
+    """
+    def __init__(self, path, mode=REPLAY, pacing=ORIGINAL_PACING):
+        if mode not in (RECORD, REPLAY):
+            raise InvalidParameterException("Cassette mode must be '%s' or '%s'" % (RECORD, REPLAY))
+        if pacing not in (ORIGINAL_PACING, FAST_PACING):
+            raise InvalidParameterException("Cassette pacing must be '%s' or '%s'" % (ORIGINAL_PACING, FAST_PACING))
+        self.path = path
+        self.mode = mode
+        self.pacing = pacing
+        self._lock = threading.Lock()
+        self._file = None
+        self._entries = defaultdict(deque)
+        if mode == RECORD:
+            self._file = gzip.open(path, 'wt')
+        else:
+            with gzip.open(path, 'rt') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._entries[self._key(entry['api'], entry['method'])].append(entry)
+
+    @property
+    def replaying(self):
+        return self.mode == REPLAY
+
+    def record(self, api, post_data, response=None, elapsed=0.0, error=None):
+        entry = {"method": 'POST' if post_data else 'GET', "api": api, "body": post_data or None,
+                 "response": response, "elapsed": round(elapsed, 6), "error": error}
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line)
+
+    def replay(self, api, post_data=''):
+        key = self._key(api, 'POST' if post_data else 'GET')
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise NetworkException("No recorded response for {} {}".format(key[0], api))
+            entry = entries.popleft() if len(entries) > 1 else entries[0]
+        if self.pacing == ORIGINAL_PACING and entry["elapsed"]:
+            time.sleep(entry["elapsed"])
+        if entry["error"]:
+            raise NetworkException(entry["error"])
+        return entry["response"]
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def _key(api, method):
+        return method, api
@@ -24,13 +24,20 @@ __doc__ = """
 :mod:`vsyspy.chain` vsys chain.
 """
 
-from .errors import NetworkException
+from .errors import NetworkException, InvalidResponseException
 from .setting import *
 from .crypto import *
-from . import is_offline
+from .tracing import span
+from .wrapper import Wrapper
+from .health import NodeHealthMonitor
+from .nodepool import NodePool
+from . import is_offline as default_is_offline
 
 import time
 import logging
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 
 
 class Chain(object):
@@ -54,21 +61,88 @@ class Chain(object):
 
         api wrapper.
 
+    .. attribute:: offline
+
+        offline mode of this chain. None follows :func:`vsyspy.is_offline`,
+        i.e. the ``offline_mode`` of the current thread or the process wide flag.
+
+    ``height`` and ``get_connected_peers`` always ask the chain's own node, even
+    while ``start_node_pool`` spreads the other reads over its peers.
+
+    .. attribute:: health_monitor
+
+        NodeHealthMonitor started by ``start_health_monitor``, default: None.
+        While it runs, ``self_check`` and ``check_with_other_node`` answer from its latest poll.
+
+    A chain is safe to share between threads, as is its wrapper.
+
     """
-    def __init__(self, chain_name, chain_id, address_version, api_wrapper):
+    def __init__(self, chain_name, chain_id, address_version, api_wrapper, offline=None):
         self.chain_name = chain_name
         self.chain_id = chain_id
         self.address_version = address_version
         self.api_wrapper = api_wrapper
+        self.offline = offline
+        self.health_monitor = None
         self.logger = logging.getLogger(__name__)
+        self._query_cache = {}
+        self._query_cache_height = None
+        self._query_cache_lock = threading.Lock()
+        self._utx_snapshot = None
+        self._all_slots_info_supported = True
+        self._utx_lock = threading.Lock()
+
+    def is_offline(self):
+        if self.offline is not None:
+            return self.offline
+        return default_is_offline()
+
+    def set_offline(self):
+        self.offline = True
+
+    def set_online(self):
+        self.offline = False
 
     def height(self):
-        if is_offline():
+        if self.is_offline():
             raise NetworkException("Cannot check height in offline mode.")
         else:
-            return self.api_wrapper.request('blocks/height')['height']
+            # pinned: the height describes this chain's node, not a peer of its node pool
+            return self.api_wrapper.request('blocks/height', pinned=True)['height']
+
+    def start_health_monitor(self, reference_nodes=(), interval=DEFAULT_HEALTH_INTERVAL,
+                             stall_timeout=DEFAULT_HEALTH_STALL_TIMEOUT, max_lag=DEFAULT_SUPER_NODE_NUM):
+        if self.health_monitor is not None:
+            self.health_monitor.stop()
+        self.health_monitor = NodeHealthMonitor(self, reference_nodes, interval, stall_timeout, max_lag).start()
+        return self.health_monitor
+
+    def stop_health_monitor(self):
+        if self.health_monitor is not None:
+            self.health_monitor.stop()
+            self.health_monitor = None
+
+    def start_node_pool(self, api_port=DEFAULT_API_PORT, max_nodes=DEFAULT_POOL_SIZE, max_lag=DEFAULT_SUPER_NODE_NUM,
+                        refresh_interval=DEFAULT_POOL_REFRESH_INTERVAL):
+        """Discovers the peers of the node in the background and lets the api wrapper spread
+        its GETs over the healthy ones. Until the first discovery ends, GETs go to the node itself.
+        """
+        self.stop_node_pool()
+        pool = NodePool(self, api_port, max_nodes, max_lag, refresh_interval)
+        self.api_wrapper.node_pool = pool.start()
+        return pool
+
+    def stop_node_pool(self):
+        pool = getattr(self.api_wrapper, 'node_pool', None)
+        if pool is not None:
+            pool.stop()
+            self.api_wrapper.node_pool = None
 
     def self_check(self, super_node_num=DEFAULT_SUPER_NODE_NUM):
+        if self.health_monitor is not None:
+            healthy = self.health_monitor.is_healthy()
+            if healthy is not None:
+                return healthy
         try:
             # check connected peers
             peers = self.get_connected_peers()
@@ -94,8 +168,12 @@ class Chain(object):
             return False
 
     def check_with_other_node(self, node_host, super_node_num=DEFAULT_SUPER_NODE_NUM):
-        if is_offline():
+        if self.is_offline():
             raise NetworkException("Cannot check height in offline mode.")
+        if self.health_monitor is not None:
+            lag = self.health_monitor.lag_behind(node_host)
+            if lag is not None:
+                return lag <= super_node_num
         try:
             h1 = self.height()
         except NetworkException:
@@ -111,9 +189,9 @@ class Chain(object):
         return h2 - h1 <= super_node_num
 
     def get_connected_peers(self):
-        if is_offline():
+        if self.is_offline():
             raise NetworkException("Cannot check height in offline mode.")
-        response = self.api_wrapper.request('peers/connected')
+        response = self.api_wrapper.request('peers/connected', pinned=True)
         if not response.get("peers"):
             return []
         else:
@@ -122,8 +200,8 @@ class Chain(object):
     def lastblock(self):
         return self.api_wrapper.request('blocks/last')
 
-    def block(self, n):
-        return self.api_wrapper.request('blocks/at/%d' % n)
+    def block(self, n, pinned=False):
+        return self.api_wrapper.request('blocks/at/%d' % n, pinned=pinned)
 
     def tx(self, id):
         return self.api_wrapper.request('transactions/info/%s' % id)
@@ -131,10 +209,130 @@ class Chain(object):
     def unconfirmed_tx(self, id):
         return self.api_wrapper.request('transactions/unconfirmed/info/%s' % id)
 
+    def utx_size(self):
+        resp = self.api_wrapper.request('transactions/unconfirmed/size')
+        if not isinstance(resp, dict) or 'size' not in resp:
+            raise NetworkException("Failed to get UTX pool size. ({})".format(resp))
+        return resp['size']
+
+    def utx_snapshot(self, max_age=0):
+        """Fetches the whole UTX pool in one request and diffs it against the previous snapshot.
+
+        A snapshot younger than ``max_age`` seconds is returned as is.
+        """
+        with self._utx_lock:
+            previous = self._utx_snapshot
+            if previous is not None and time.time() - previous.taken_at < max_age:
+                return previous
+            resp = self.api_wrapper.request('transactions/unconfirmed')
+            if not isinstance(resp, list):
+                raise NetworkException("Failed to get UTX pool. ({})".format(resp))
+            self._utx_snapshot = UtxSnapshot(resp, previous)
+            return self._utx_snapshot
+
+    def is_pending(self, tx_id, max_age=0):
+        return tx_id in self.utx_snapshot(max_age)
+
+    def pending_many(self, tx_ids, max_age=0):
+        """Tells for many tx ids whether they are in the UTX pool, from one snapshot.
+        """
+        snapshot = self.utx_snapshot(max_age)
+        return dict((tx_id, tx_id in snapshot) for tx_id in tx_ids)
+
     def slot_info(self, slot_id):
         return self.api_wrapper.request('consensus/slotInfo/%s' % slot_id)
 
+    def slot_infos(self, max_workers=DEFAULT_QUERY_WORKERS):
+        """Fetches the info of all slots, cached until the next block.
+
+        All slots come in one ``consensus/allSlotsInfo`` request; nodes without it are
+        swept slot by slot concurrently.
+        """
+        infos = self._all_slots_info()
+        if infos is None:
+            apis = ['consensus/slotInfo/%d' % slot_id for slot_id in range(SLOT_COUNT)]
+            infos = self._cached_requests(apis, max_workers)
+        for slot_id, info in enumerate(infos):
+            if not isinstance(info, dict) or info.get('mintingAverageBalance') is None:
+                raise NetworkException("Failed to get info of slot {}. ({})".format(slot_id, info))
+        return infos
+
+    def _all_slots_info(self):
+        if not self._all_slots_info_supported:
+            return None
+        try:
+            resp = self._cached_requests(['consensus/allSlotsInfo'], 1)[0]
+        except InvalidResponseException as ex:
+            # a node without the route answers a plain text 404, which is not retried
+            if ex.status_code == 404:
+                self._all_slots_info_supported = False
+            return None
+        except NetworkException:
+            return None
+        if not isinstance(resp, list):
+            # nodes without the endpoint answer 404, skip it from now on
+            if isinstance(resp, dict) and resp.get('error') == 404:
+                self._all_slots_info_supported = False
+            return None
+        # the first element carries the height, the slots follow
+        slots = dict((info['slotId'], info) for info in resp if isinstance(info, dict) and 'slotId' in info)
+        if len(slots) != SLOT_COUNT:
+            return None
+        return [slots.get(slot_id) for slot_id in range(SLOT_COUNT)]
+
+    def minting_average_balances(self, max_workers=DEFAULT_QUERY_WORKERS):
+        """Returns the minting average balance of every slot as an array indexed by slot id.
+        """
+        return array('q', [info['mintingAverageBalance'] for info in self.slot_infos(max_workers)])
+
+    def contract_data(self, contract_id, db_key):
+        return self.contract_data_many(contract_id, [db_key])[db_key]
+
+    def contract_data_many(self, contract_id, db_keys, max_workers=DEFAULT_QUERY_WORKERS):
+        """Fetches many contract DB entries, keyed by their base58 db key.
+        """
+        apis = ['contract/data/%s/%s' % (contract_id, db_key) for db_key in db_keys]
+        return dict(zip(db_keys, self._cached_requests(apis, max_workers)))
+
+    def token_balance(self, address, token_id):
+        return self.token_balances([address], token_id)[address]
+
+    def token_balances(self, addresses, token_id, max_workers=DEFAULT_QUERY_WORKERS):
+        """Fetches the token balance of many addresses, keyed by address.
+        """
+        apis = ['contract/balance/%s/%s' % (address, token_id) for address in addresses]
+        balances = {}
+        for address, resp in zip(addresses, self._cached_requests(apis, max_workers)):
+            if 'balance' not in resp:
+                raise NetworkException("Failed to get token balance of {}. ({})".format(address, resp))
+            balances[address] = resp['balance']
+        return balances
+
+    def _cached_requests(self, apis, max_workers):
+        # state reads are cached per height, so one sweep per block is enough
+        height = self.height()
+        with self._query_cache_lock:
+            if height != self._query_cache_height:
+                self._query_cache = {}
+                self._query_cache_height = height
+            cache = self._query_cache
+            fetched = dict((api, cache[api]) for api in apis if api in cache)
+        missing = list(set(api for api in apis if api not in fetched))
+        if missing:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing)))) as executor:
+                responses = list(executor.map(self.api_wrapper.request, missing))
+            with self._query_cache_lock:
+                for api, resp in zip(missing, responses):
+                    fetched[api] = resp
+                    if isinstance(resp, list) or isinstance(resp, dict) and 'error' not in resp:
+                        cache[api] = resp
+        return [fetched[api] for api in apis]
+
     def validate_address(self, address):
+        with span('validate_address'):
+            return self._validate_address(address)
+
+    def _validate_address(self, address):
         addr = bytes2str(base58.b58decode(address))
         if addr[0] != chr(self.address_version):
             self.logger.error("Wrong address version")
@@ -154,3 +352,44 @@ class Chain(object):
         addressHash = hashChain(str2bytes(unhashedAddress))[0:4]
         address = bytes2str(base58.b58encode(str2bytes(unhashedAddress + addressHash)))
         return address
+
+
+class UtxSnapshot(object):
+    """Class for UtxSnapshot.
+
+    A view of the UTX pool taken by ``Chain.utx_snapshot``.
+
+    .. attribute:: txs
+
+        unconfirmed tx json, keyed by tx id.
+
+    .. attribute:: added
+
+        ids that entered the pool since the previous snapshot.
+
+    .. attribute:: removed
+
+        ids that left the pool since the previous snapshot, i.e. confirmed or dropped.
+
+    .. attribute:: taken_at
+
+        time the snapshot was taken.
+
+    """
+    def __init__(self, txs, previous=None):
+        self.txs = dict((tx['id'], tx) for tx in txs)
+        self.taken_at = time.time()
+        ids = frozenset(self.txs)
+        previous_ids = frozenset(previous.txs) if previous is not None else frozenset()
+        self.added = ids - previous_ids
+        self.removed = previous_ids - ids
+
+    @property
+    def size(self):
+        return len(self.txs)
+
+    def __contains__(self, tx_id):
+        return tx_id in self.txs
+
+    def __len__(self):
+        return len(self.txs)
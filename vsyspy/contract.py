@@ -27,16 +27,92 @@ __doc__ = """
 from .crypto import *
 from .deser import Deser
 from .errors import *
-from .setting import ContractMeta
+from .tracing import span
+from .setting import ContractMeta, CONTRACT_CACHE_SIZE, TOKEN_ID_CACHE_SIZE, Contract_Permitted_Without_Split, \
+    Contract_Permitted_With_Split, Contract_Lock
 
 import struct
 import base58
+import functools
+import hashlib
 import itertools
 import logging
+import numbers
+import threading
+from collections import OrderedDict
+from copy import deepcopy
 
 logger = logging.getLogger(__name__)
 
 
+class ContractCache(object):
+    """Bounded LRU cache of parsed contracts.
+
+    Entries are keyed by the sha256 digest of the contract bytes, so the same
+    contract reached through different strings or objects is parsed only once.
+
+    .. attribute:: max_size
+
+        maximum number of parsed contracts kept in the cache.
+
+    """
+    def __init__(self, max_size=CONTRACT_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(contract_bytes):
+        return hashlib.sha256(contract_bytes).digest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+contract_cache = ContractCache()
+
+_TEMPLATES = (Contract_Permitted_Without_Split, Contract_Permitted_With_Split, Contract_Lock)
+_template_bytes = {}
+
+
+def contract_bytes_from_base58_string(contract_bytes_string):
+    """Decodes a contract string, decoding the built-in templates only once.
+    """
+    contract_bytes = _template_bytes.get(contract_bytes_string)
+    if contract_bytes is None:
+        contract_bytes = base58.b58decode(contract_bytes_string)
+        if contract_bytes_string in _TEMPLATES:
+            _template_bytes[contract_bytes_string] = contract_bytes
+    return contract_bytes
+
+
 class Contract(object):
     """Class for Contract.
 
@@ -70,8 +146,15 @@ class Contract(object):
 
         VSYS contract state variable, type: list(bytes).
 
+    ``bytes``, ``base58_string`` and ``json`` are memoized and recomputed only
+    after one of the attributes above is assigned.
+
     """
+    _serialized_fields = frozenset(['language_code', 'language_version', 'trigger', 'descriptor',
+                                    'state_variable', 'state_map', 'textual'])
+
     def __init__(self, base58_string=None):
+        self._serialized = {}
         self.language_code = None
         self.language_version = None
         self.trigger = None
@@ -82,8 +165,26 @@ class Contract(object):
         if base58_string:
             self.from_base58_string(base58_string)
 
+    def __setattr__(self, name, value):
+        # serialized forms are memoized, so assigning any contract field drops them
+        if name in self._serialized_fields:
+            self._serialized.clear()
+        object.__setattr__(self, name, value)
+
+    def invalidate(self):
+        """Drops the memoized serialized forms.
+
+        Needed only after editing a field in place, e.g. ``contract.trigger.append(...)``.
+        """
+        self._serialized.clear()
+
     @property
     def json(self):
+        if 'json' not in self._serialized:
+            self._serialized['json'] = self._build_json()
+        return deepcopy(self._serialized['json'])
+
+    def _build_json(self):
         return {"language_code": Deser.deserialize_string(self.language_code),
                 "language_version": int.from_bytes(self.language_version, byteorder='big'),
                 "triggers": [bytes2str(base58.b58encode(x)) for x in self.trigger],
@@ -99,6 +200,11 @@ class Contract(object):
 
     @property
     def bytes(self):
+        if 'bytes' not in self._serialized:
+            self._serialized['bytes'] = self._build_bytes()
+        return self._serialized['bytes']
+
+    def _build_bytes(self):
         if self.language_version == struct.pack(">I", 1):
             return self.language_code + self.language_version \
                    + Deser.serialize_array(Deser.serialize_arrays(self.trigger)) \
@@ -115,13 +221,30 @@ class Contract(object):
 
     @property
     def base58_string(self):
-        return bytes2str(base58.b58encode(self.bytes))
+        if 'base58_string' not in self._serialized:
+            self._serialized['base58_string'] = bytes2str(base58.b58encode(self.bytes))
+        return self._serialized['base58_string']
 
     def from_base58_string(self, contract_bytes_string):
-        contract_bytes = base58.b58decode(contract_bytes_string)
+        contract_bytes = contract_bytes_from_base58_string(contract_bytes_string)
         self.from_bytes(contract_bytes)
 
     def from_bytes(self, contract_bytes):
+        key = ContractCache.key(contract_bytes)
+        entry = contract_cache.get(key)
+        if entry is None:
+            with span('contract_parse'):
+                self._parse_bytes(contract_bytes)
+            contract_cache.put(key, (self.language_code, self.language_version, tuple(self.trigger),
+                                     tuple(self.descriptor), tuple(self.state_variable), tuple(self.state_map),
+                                     tuple(self.textual)))
+        else:
+            # lists are copied so that callers editing a contract never touch the cached entry
+            self.language_code, self.language_version = entry[0], entry[1]
+            self.trigger, self.descriptor, self.state_variable, self.state_map, self.textual = \
+                [list(x) for x in entry[2:]]
+
+    def _parse_bytes(self, contract_bytes):
         try:
             self.language_code = contract_bytes[0:ContractMeta.language_code_byte_length]
             self.language_version = contract_bytes[ContractMeta.language_code_byte_length:ContractMeta.language_code_byte_length + ContractMeta.language_version_byte_length]
@@ -163,14 +286,73 @@ def bytes_builder_from_list(input_list):
 
 
 def token_id_from_contract_id(contract_id, idx):
+    return _token_id(_token_id_prefix(contract_id), idx)
+
+
+def token_ids_from_contract_id(contract_id, indices):
+    """Derives the token ids of one contract for every index in ``indices``, e.g. ``range(10)``.
+    """
+    prefix = _token_id_prefix(contract_id)
+    return [_token_id(prefix, idx) for idx in indices]
+
+
+def token_ids_from_pairs(pairs):
+    """Derives token ids for an iterable of ``(contract_id, idx)`` pairs.
+    """
+    return [_token_id(_token_id_prefix(contract_id), idx) for contract_id, idx in pairs]
+
+
+@functools.lru_cache(maxsize=256)
+def _token_id_prefix(contract_id):
     address_bytes = base58.b58decode(contract_id)
     contract_id_no_check_sum = address_bytes[1:(len(address_bytes) - ContractMeta.check_sum_length)]
-    without_check_sum = struct.pack("b", ContractMeta.token_address_version) + contract_id_no_check_sum + struct.pack(">I",
-                                                                                                              idx)
+    return struct.pack("b", ContractMeta.token_address_version) + contract_id_no_check_sum
+
+
+@functools.lru_cache(maxsize=TOKEN_ID_CACHE_SIZE)
+def _token_id(prefix, idx):
+    without_check_sum = prefix + struct.pack(">I", idx)
     return bytes2str(base58.b58encode(without_check_sum + str2bytes(hashChain(without_check_sum)[0:ContractMeta.check_sum_length])))
 
 
+class TokenIndex(object):
+    """In-memory index from token id back to ``(contract_id, idx)``.
+
+    Token ids are one-way hashes of the contract id, so contracts have to be
+    registered with ``add_contract`` before their tokens can be looked up.
+    """
+    def __init__(self):
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def __contains__(self, token_id):
+        return token_id in self._tokens
+
+    def add_contract(self, contract_id, indices=range(1)):
+        indices = list(indices)
+        token_ids = token_ids_from_contract_id(contract_id, indices)
+        with self._lock:
+            for idx, token_id in zip(indices, token_ids):
+                self._tokens[token_id] = (contract_id, idx)
+        return token_ids
+
+    def lookup(self, token_id):
+        """Returns ``(contract_id, idx)`` of an indexed token id, or None.
+        """
+        return self._tokens.get(token_id)
+
+    def contract_id(self, token_id):
+        entry = self._tokens.get(token_id)
+        return entry[0] if entry else None
+
+
 def serialize_data(data_entry_list):
+    if isinstance(data_entry_list, bytes):
+        # already serialized, e.g. by serialize_transfer_data
+        return data_entry_list
     custom_data_stack = []
     if not type(data_entry_list) is list:
         data_entry_list = [data_entry_list]
@@ -179,76 +361,94 @@ def serialize_data(data_entry_list):
     return Deser.serialize_array(custom_data_stack)
 
 
+def serialize_transfer_data(recipients, amounts):
+    """Serializes many ``[DataEntry(recipient, Type.address), DataEntry(amount, Type.amount)]`` stacks at once.
+
+    Returns one function data byte string per recipient, ready to be passed as the
+    data stack of ``Account.execute_contract``. NumPy is used for the bulk packing
+    when it is installed.
+    """
+    if len(recipients) != len(amounts):
+        raise ValueError("Got %d recipients but %d amounts" % (len(recipients), len(amounts)))
+    if len(recipients) == 0:
+        return []
+    address_bytes = [base58.b58decode(recipient) for recipient in recipients]
+    for recipient, data_bytes in zip(recipients, address_bytes):
+        if len(data_bytes) != Type.address_length:
+            raise ValueError("Invalid DataEntry data: %s, type: %s" % (str(recipient), str(Type.address)))
+    # checked up front for both paths, numpy would silently truncate 1.7 to 1
+    kind = getattr(getattr(amounts, 'dtype', None), 'kind', 'O')
+    if kind not in 'iu' and (kind != 'O' or not all(isinstance(amount, numbers.Integral) for amount in amounts)):
+        raise ValueError("Invalid DataEntry amount, each amount must be an integer")
+    if min(amounts) <= 0 or max(amounts) > _max_amount:
+        raise ValueError("Invalid DataEntry amount, each amount must be in 1 to %d" % _max_amount)
+    try:
+        import numpy
+    except ImportError:
+        return [_transfer_row.pack(2, Type.address[0], data_bytes, Type.amount[0], amount)
+                for data_bytes, amount in zip(address_bytes, amounts)]
+    rows = numpy.zeros(len(recipients), dtype=[('length', '>u2'), ('address_type', 'u1'),
+                                               ('address', 'S%d' % Type.address_length), ('amount_type', 'u1'),
+                                               ('amount', '>u8')])
+    rows['length'] = 2
+    rows['address_type'] = Type.address[0]
+    rows['address'] = address_bytes
+    rows['amount_type'] = Type.amount[0]
+    rows['amount'] = numpy.asarray(amounts, dtype=numpy.uint64)
+    buf = rows.tobytes()
+    size = _transfer_row.size
+    return [buf[i:i + size] for i in range(0, len(buf), size)]
+
+
 def data_entry_from_base58_str(str_object):
     base58_str = base58.b58decode(str_object)
     return data_entries_from_bytes(base58_str)
 
 
 def data_entries_from_bytes(bytes_object):
-    length = struct.unpack(">H", bytes_object[0:2])[0]
-    all_data = []
+    return list(iter_data_entries(bytes_object))
+
+
+def iter_data_entries(bytes_object):
+    """Yields the DataEntry objects of a serialized data stack one at a time.
+
+    Works on a memoryview of the input, so no per-entry copy of the stack is made.
+    """
+    view = memoryview(bytes_object)
+    if len(view) < 2:
+        raise ValueError("Invalid DataEntry stack %s" % str(bytes(view)))
+    length = _short.unpack_from(view, 0)[0]
     pos_drift = 2
     for pos in range(length):
-        [array_info, pos_drift] = parse_data_entry_array_size(bytes_object, pos_drift)
-        all_data.append(array_info)
-    return all_data
+        data_entry, pos_drift = _decode_data_entry(view, pos_drift)
+        yield data_entry
 
 
 def parse_data_entry_array_size(bytes_object, start_position):
-    if bytes_object[start_position: start_position + 1] == Type.public_key:
-        return (data_entry_from_bytes(bytes_object[start_position:start_position + Type.key_length + 1]),
-                start_position + Type.key_length + 1)
-    elif bytes_object[start_position: start_position + 1] == Type.address:
-        return (data_entry_from_bytes(bytes_object[start_position:start_position + Type.address_length + 1]),
-                start_position + Type.address_length + 1)
-    elif bytes_object[start_position: start_position + 1] == Type.amount:
-        return (data_entry_from_bytes(bytes_object[start_position:start_position + Type.amount_length + 1]),
-                start_position + Type.amount_length + 1)
-    elif bytes_object[start_position: start_position + 1] == Type.int32:
-        return (data_entry_from_bytes(bytes_object[start_position:start_position + Type.int32_length + 1]),
-                start_position + Type.int32_length + 1)
-    elif bytes_object[start_position: start_position + 1] == Type.short_text:
-        return (data_entry_from_bytes(bytes_object[start_position:start_position + struct.unpack(">H", bytes_object[
-                                                                                                       start_position + 1:start_position + 3])[
-            0] + 3]),
-                start_position + struct.unpack(">H", bytes_object[start_position + 1: start_position + 3])[0] + 3)
-    elif bytes_object[start_position: start_position + 1] == Type.contract_account:
-        return (data_entry_from_bytes(bytes_object[start_position:start_position + Type.address_length + 1]),
-                start_position + Type.address_length + 1)
-    elif bytes_object[start_position: start_position + 1] == Type.token_id:
-        return (data_entry_from_bytes(bytes_object[start_position:start_position + Type.token_address_length + 1]),
-                start_position + Type.token_address_length + 1)
-    elif bytes_object[start_position: start_position + 1] == Type.timestamp:
-        return (data_entry_from_bytes(bytes_object[start_position:start_position + Type.amount_length + 1]),
-                start_position + Type.amount_length + 1)
-    elif bytes_object[start_position: start_position + 1] == Type.short_bytes:
-        return (data_entry_from_bytes(bytes_object[start_position:start_position + struct.unpack(">H", bytes_object[
-                                                                                                       start_position + 1:start_position + 3])[
-            0] + 3]),
-                start_position + struct.unpack(">H", bytes_object[start_position + 1: start_position + 3])[0] + 3)
+    return _decode_data_entry(memoryview(bytes_object), start_position)
 
 
 def data_entry_from_bytes(bytes_object):
     if len(bytes_object) == 0:
         raise ValueError("Invalid DataEntry %s" % str(bytes_object))
-    elif bytes_object[0:1] == Type.public_key:
-        return DataEntry(bytes2str(base58.b58encode(bytes_object[1:])), bytes_object[0:1])
-    elif bytes_object[0:1] == Type.address:
-        return DataEntry(bytes2str(base58.b58encode(bytes_object[1:])), bytes_object[0:1])
-    elif bytes_object[0:1] == Type.amount:
-        return DataEntry(struct.unpack(">Q", bytes_object[1:])[0], bytes_object[0:1])
-    elif bytes_object[0:1] == Type.int32:
-        return DataEntry(struct.unpack(">I", bytes_object[1:])[0], bytes_object[0:1])
-    elif bytes_object[0:1] == Type.short_text:
-        return DataEntry(bytes2str(bytes_object[3:]), bytes_object[0:1])
-    elif bytes_object[0:1] == Type.contract_account:
-        return DataEntry(bytes2str(base58.b58encode(bytes_object[1:])), bytes_object[0:1])
-    elif bytes_object[0:1] == Type.token_id:
-        return DataEntry(bytes2str(base58.b58encode(bytes_object[1:])), bytes_object[0:1])
-    elif bytes_object[0:1] == Type.timestamp:
-        return DataEntry(struct.unpack(">Q", bytes_object[1:])[0], bytes_object[0:1])
-    elif bytes_object[0:1] == Type.short_bytes:
-        return DataEntry(bytes2str(bytes_object[3:]), bytes_object[0:1])
+    return _decode_data_entry(memoryview(bytes_object), 0)[0]
+
+
+def _decode_data_entry(view, start_position):
+    try:
+        type_id = view[start_position]
+        width = _data_entry_decoders[type_id][0]
+    except (IndexError, KeyError):
+        raise ValueError("Invalid DataEntry type at position %d" % start_position)
+    if width is None:
+        if start_position + 3 > len(view):
+            raise ValueError("Truncated DataEntry at position %d" % start_position)
+        end = start_position + 3 + _short.unpack_from(view, start_position + 1)[0]
+    else:
+        end = start_position + 1 + width
+    if end > len(view):
+        raise ValueError("Truncated DataEntry at position %d" % start_position)
+    return DataEntry.from_payload(type_id, view[start_position + 1:end].tobytes()), end
 
 
 def check_data_type(data, data_type):
@@ -276,39 +476,61 @@ def check_data_type(data, data_type):
         return True
 
 
-class DataEntry:
+class DataEntry(object):
+    """Class for DataEntry.
+
+    Only the type id and the encoded payload are stored; ``data`` is decoded
+    on first access and ``bytes`` is derived from the two.
+
+    .. attribute:: type_id
+
+        DataEntry type id, e.g. ``Type.amount[0]``.
+
+    .. attribute:: data_bytes
+
+        encoded payload, including the length prefix of text and bytes types.
+
+    """
+    __slots__ = ('type_id', 'data_bytes', '_data')
+
     def __init__(self, data, data_type):
-        if not check_data_type(data, data_type):
+        type_id = data_type if isinstance(data_type, int) else ord(data_type)
+        try:
+            encode, check = _data_entry_encoders[type_id]
+        except KeyError:
+            raise ValueError("Invalid DataEntry data: %s, type: %s" % (str(data), str(data_type)))
+        data_bytes = encode(data)
+        if check and not check(data, data_bytes):
             raise ValueError("Invalid DataEntry data: %s, type: %s" % (str(data), str(data_type)))
-        if data_type == Type.public_key:
-            self.data_bytes = base58.b58decode(data)
-            self.data_type = 'public_key'
-        elif data_type == Type.address:
-            self.data_bytes = base58.b58decode(data)
-            self.data_type = 'address'
-        elif data_type == Type.amount:
-            self.data_bytes = struct.pack(">Q", data)
-            self.data_type = 'amount'
-        elif data_type == Type.int32:
-            self.data_bytes = struct.pack(">I", data)
-            self.data_type = 'int32'
-        elif data_type == Type.short_text:
-            self.data_bytes = Deser.serialize_array(str2bytes(data))
-            self.data_type = 'short_text'
-        elif data_type == Type.contract_account:
-            self.data_bytes = base58.b58decode(data)
-            self.data_type = 'contract_account'
-        elif data_type == Type.token_id:
-            self.data_bytes = base58.b58decode(data)
-            self.data_type = 'token_id'
-        elif data_type == Type.timestamp:
-            self.data_bytes = struct.pack(">Q", data)
-            self.data_type = 'timestamp'
-        elif data_type == Type.short_bytes:
-            self.data_bytes = Deser.serialize_array(str2bytes(data))
-            self.data_type = 'short_bytes'
-        self.data = data
-        self.bytes = data_type + self.data_bytes
+        self.type_id = type_id
+        self.data_bytes = data_bytes
+        self._data = data
+
+    @classmethod
+    def from_payload(cls, type_id, data_bytes):
+        """Builds a DataEntry from an already encoded payload without decoding it.
+        """
+        data_entry = cls.__new__(cls)
+        data_entry.type_id = type_id
+        data_entry.data_bytes = data_bytes
+        data_entry._data = None
+        return data_entry
+
+    @property
+    def data(self):
+        if self._data is None:
+            width, decode = _data_entry_decoders[self.type_id]
+            view = memoryview(self.data_bytes)
+            self._data = decode(view, 0 if width else 2, len(view))
+        return self._data
+
+    @property
+    def data_type(self):
+        return _type_names[self.type_id]
+
+    @property
+    def bytes(self):
+        return _type_bytes[self.type_id] + self.data_bytes
 
 
 class Type:
@@ -332,3 +554,76 @@ class Type:
     short_bytes = struct.pack(">B", 11)
     max_short_bytes_size = 255
     balance = struct.pack(">B", 12)
+
+
+_short = struct.Struct(">H")
+_int = struct.Struct(">I")
+_long = struct.Struct(">Q")
+_max_amount = 2 ** 64 - 1
+_transfer_row = struct.Struct(">HB%dsBQ" % Type.address_length)
+
+
+def _decode_base58(view, start, end):
+    return bytes2str(base58.b58encode(view[start:end].tobytes()))
+
+
+def _decode_long(view, start, end):
+    return _long.unpack_from(view, start)[0]
+
+
+def _decode_int(view, start, end):
+    return _int.unpack_from(view, start)[0]
+
+
+def _decode_text(view, start, end):
+    return bytes2str(view[start:end].tobytes())
+
+
+# type id -> (fixed payload width or None for length-prefixed payloads, decoder)
+_data_entry_decoders = {
+    Type.public_key[0]: (Type.key_length, _decode_base58),
+    Type.address[0]: (Type.address_length, _decode_base58),
+    Type.amount[0]: (Type.amount_length, _decode_long),
+    Type.int32[0]: (Type.int32_length, _decode_int),
+    Type.short_text[0]: (None, _decode_text),
+    Type.contract_account[0]: (Type.contract_account_length, _decode_base58),
+    Type.token_id[0]: (Type.token_address_length, _decode_base58),
+    Type.timestamp[0]: (Type.amount_length, _decode_long),
+    Type.short_bytes[0]: (None, _decode_text),
+}
+
+
+def _encode_base58(data):
+    return base58.b58decode(data)
+
+
+def _encode_long(data):
+    return _long.pack(data)
+
+
+def _encode_int(data):
+    return _int.pack(data)
+
+
+def _encode_text(data):
+    return Deser.serialize_array(str2bytes(data))
+
+
+# type id -> (encoder, validity check on (data, encoded payload) or None), mirroring check_data_type
+_data_entry_encoders = {
+    Type.public_key[0]: (_encode_base58, lambda data, data_bytes: len(data_bytes) == Type.key_length),
+    Type.address[0]: (_encode_base58, lambda data, data_bytes: len(data_bytes) == Type.address_length),
+    Type.amount[0]: (_encode_long, lambda data, data_bytes: data > 0),
+    Type.int32[0]: (_encode_int, lambda data, data_bytes: data > 0),
+    Type.short_text[0]: (_encode_text, lambda data, data_bytes: len(data_bytes) <= Type.max_short_text_size + 2),
+    Type.contract_account[0]: (_encode_base58, None),
+    Type.token_id[0]: (_encode_base58, None),
+    Type.timestamp[0]: (_encode_long, None),
+    Type.short_bytes[0]: (_encode_text, lambda data, data_bytes: len(data_bytes) <= Type.max_short_bytes_size + 2),
+}
+
+_type_bytes = dict((type_id, struct.pack(">B", type_id)) for type_id in _data_entry_decoders)
+
+_type_names = dict((getattr(Type, name)[0], name) for name in
+                   ['public_key', 'address', 'amount', 'int32', 'short_text', 'contract_account', 'token_id',
+                    'timestamp', 'short_bytes'])
@@ -1,12 +1,30 @@
 import hashlib
-import pyblake2
-import axolotl_curve25519 as curve
+import importlib
 import base58
 import os
 from math import log
 from operator import xor
 from copy import deepcopy
 import functools
+from .tracing import span
+
+
+class LazyModule(object):
+    """Module proxy that imports the real module on first attribute access.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+# native extensions are only loaded once a key is generated, a hash is taken or a message is signed
+pyblake2 = LazyModule('pyblake2')
+curve = LazyModule('axolotl_curve25519')
 
 
 if bytes == str:  # python2
@@ -268,15 +286,50 @@ def sha256(s):
 
 
 def hashChain(s):
-    a=pyblake2.blake2b(s, digest_size=32).digest()
-    b=keccak256.digest(a)
+    with span('hash'):
+        a=pyblake2.blake2b(s, digest_size=32).digest()
+        b=keccak256.digest(a)
     return b
 
 
 def sign(privateKey, message):
-    random64 = os.urandom(64)
-    return base58.b58encode(curve.calculateSignature(random64, base58.b58decode(privateKey), message))
+    with span('sign'):
+        random64 = os.urandom(64)
+        return base58.b58encode(curve.calculateSignature(random64, base58.b58decode(privateKey), message))
+
+
+def verify(publicKey, message, signature):
+    with span('verify'):
+        return curve.verifySignature(base58.b58decode(publicKey), message, base58.b58decode(signature)) == 0
+
+
+def _verify_item(item):
+    return verify(*item)
+
+
+# below this many signatures a process pool costs more than it saves
+VERIFY_POOL_THRESHOLD = 64
+
+
+def verify_many(items, max_workers=None):
+    """Verifies (publicKey, message, signature) triples, spread over a process pool.
+
+    Returns a list of booleans in the order of ``items``.
+    """
+    items = list(items)
+    if len(items) < VERIFY_POOL_THRESHOLD or max_workers == 1:
+        return [_verify_item(item) for item in items]
+    # loading multiprocessing costs more import time than the rest of vsyspy
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        chunksize = max(1, len(items) // ((max_workers or os.cpu_count() or 1) * 4))
+        return list(executor.map(_verify_item, items, chunksize=chunksize))
 
 
 def id(message):
     return base58.b58encode(hashlib.sha256(message).digest())
+
+
+def transaction_id(message):
+    # the node derives a tx id from the blake2b-256 hash of its signing bytes
+    return bytes2str(base58.b58encode(pyblake2.blake2b(message, digest_size=32).digest()))
@@ -36,3 +36,9 @@ class MissingAddressException(VSYSPYException):
 
 class InvalidContractException(VSYSPYException):
     pass
+
+
+class InvalidResponseException(NetworkException):
+    def __init__(self, message, status_code=None):
+        NetworkException.__init__(self, message)
+        self.status_code = status_code
@@ -0,0 +1,165 @@
+__copyright__ = "Copyright (C) 2019 Icerm"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+__doc__ = """
+:mod:`vsyspy.health` background health monitor of a full node.
+"""
+
+from .errors import NetworkException
+from .setting import DEFAULT_SUPER_NODE_NUM, DEFAULT_HEALTH_INTERVAL, DEFAULT_HEALTH_STALL_TIMEOUT
+from .wrapper import Wrapper
+
+import logging
+import threading
+import time
+
+
+class NodeHealthMonitor(object):
+    """Class for NodeHealthMonitor.
+
+    A daemon thread polls the node of a chain every ``interval`` seconds for
+    its connected peers and height, and the height of the reference nodes.
+    ``status`` and ``is_healthy`` only read the latest poll, so they never block
+    on the network.
+
+    .. attribute:: chain
+
+        VSYS chain object of the monitored node.
+
+    .. attribute:: reference_nodes
+
+        node hosts (or Wrapper objects) the height is compared with.
+
+    .. attribute:: interval
+
+        seconds between polls.
+
+    .. attribute:: stall_timeout
+
+        seconds without a new block after which the node counts as stalled.
+
+    .. attribute:: max_lag
+
+        blocks the node may trail the highest reference node.
+
+    """
+    def __init__(self, chain, reference_nodes=(), interval=DEFAULT_HEALTH_INTERVAL,
+                 stall_timeout=DEFAULT_HEALTH_STALL_TIMEOUT, max_lag=DEFAULT_SUPER_NODE_NUM):
+        self.chain = chain
+        self.reference_nodes = [node if isinstance(node, Wrapper) else Wrapper(node, timeout=interval, retries=0)
+                                for node in reference_nodes]
+        self.interval = interval
+        self.stall_timeout = stall_timeout
+        self.max_lag = max_lag
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._status = {'checked_at': None, 'peers': None, 'height': None, 'height_changed_at': None,
+                        'reference_heights': {}, 'lag': None, 'error': None}
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='vsyspy-health')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll()
+            self._stop.wait(self.interval)
+
+    def poll(self):
+        """Polls the node and the reference nodes once and updates the status.
+        """
+        now = time.time()
+        status = self.status()
+        status['checked_at'] = now
+        try:
+            status['peers'] = len(self.chain.get_connected_peers())
+            height = self.chain.height()
+            if height != status['height']:
+                status['height'] = height
+                status['height_changed_at'] = now
+            status['error'] = None
+        except (NetworkException, KeyError) as ex:
+            self.logger.error("Fail to connect full node. ({})".format(ex))
+            status['error'] = str(ex) or ex.__class__.__name__
+        reference_heights = {}
+        for wrapper in self.reference_nodes:
+            try:
+                reference_heights[wrapper.node_host] = wrapper.request('blocks/height')['height']
+            except (NetworkException, KeyError, TypeError):
+                self.logger.info("Fail to connect reference node {}.".format(wrapper.node_host))
+        status['reference_heights'] = reference_heights
+        if reference_heights and status['height'] is not None:
+            status['lag'] = max(reference_heights.values()) - status['height']
+        else:
+            status['lag'] = None
+        with self._lock:
+            self._status = status
+        return status
+
+    def status(self):
+        """Returns a copy of the latest polled status.
+        """
+        with self._lock:
+            status = dict(self._status)
+        status['reference_heights'] = dict(status['reference_heights'])
+        return status
+
+    def is_healthy(self):
+        """Tells from the latest poll whether the node has peers, makes blocks and keeps up with the reference nodes.
+
+        Returns None before the first poll.
+        """
+        status = self.status()
+        if status['checked_at'] is None:
+            return None
+        if status['error'] or not status['peers']:
+            return False
+        if status['height_changed_at'] is None or time.time() - status['height_changed_at'] > self.stall_timeout:
+            return False
+        return status['lag'] is None or status['lag'] <= self.max_lag
+
+    def lag_behind(self, node_host):
+        """Returns how many blocks the node trails a reference node, or None if it is unknown.
+        """
+        status = self.status()
+        other = status['reference_heights'].get(node_host)
+        if other is None or status['height'] is None:
+            return None
+        return other - status['height']
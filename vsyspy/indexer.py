@@ -0,0 +1,148 @@
+__copyright__ = "Copyright (C) 2019 Icerm"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+__doc__ = """
+:mod:`vsyspy.indexer` local address history index of a vsys chain.
+"""
+
+from .errors import NetworkException
+
+import json
+import logging
+import sqlite3
+import threading
+
+
+class AddressIndexer(object):
+    """Class for AddressIndexer.
+
+    It follows the chain block by block and keeps a SQLite index of
+    transactions by sender, recipient, type and contract id. The last indexed
+    height is stored with the index, so ``sync`` resumes where it stopped.
+
+    .. attribute:: chain
+
+        VSYS chain object.
+
+    .. attribute:: path
+
+        SQLite database path, default: ':memory:'.
+
+    """
+    def __init__(self, chain, path=':memory:', start_height=1):
+        self.chain = chain
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+            CREATE TABLE IF NOT EXISTS txs (id TEXT PRIMARY KEY, height INTEGER, type INTEGER,
+                                            timestamp INTEGER, contract_id TEXT, body TEXT);
+            CREATE TABLE IF NOT EXISTS tx_addresses (address TEXT, tx_id TEXT, role TEXT, height INTEGER,
+                                                     type INTEGER, PRIMARY KEY (address, tx_id, role));
+            CREATE INDEX IF NOT EXISTS tx_addresses_height ON tx_addresses (address, height);
+            CREATE INDEX IF NOT EXISTS txs_contract ON txs (contract_id, height);
+        ''')
+        self._db.execute("INSERT OR IGNORE INTO meta VALUES ('height', ?)", (start_height - 1,))
+        self._db.commit()
+
+    def height(self):
+        """Returns the last indexed height.
+        """
+        with self._lock:
+            return self._db.execute("SELECT value FROM meta WHERE key = 'height'").fetchone()[0]
+
+    def sync(self, to_height=None, confirmations=0):
+        """Indexes blocks after the last indexed height up to ``to_height``.
+
+        By default it follows the chain up to its current height minus ``confirmations``.
+        Returns the number of indexed blocks.
+        """
+        if to_height is None:
+            to_height = self.chain.height() - confirmations
+        count = 0
+        for height in range(self.height() + 1, to_height + 1):
+            # pinned to the node the height was read from, a pool peer may not have the block yet
+            block = self.chain.block(height, pinned=True)
+            if not isinstance(block, dict) or 'transactions' not in block:
+                raise NetworkException("Failed to get block {}. ({})".format(height, block))
+            self.index_block(height, block)
+            count += 1
+        return count
+
+    def index_block(self, height, block):
+        rows, address_rows = [], []
+        for tx in block['transactions']:
+            tx_type = tx.get('type')
+            rows.append((tx['id'], height, tx_type, tx.get('timestamp'), tx.get('contractId'), json.dumps(tx)))
+            for proof in tx.get('proofs') or []:
+                if proof.get('address'):
+                    address_rows.append((proof['address'], tx['id'], 'sender', height, tx_type))
+            if tx.get('recipient'):
+                address_rows.append((tx['recipient'], tx['id'], 'recipient', height, tx_type))
+        with self._lock:
+            with self._db:
+                self._db.executemany("INSERT OR REPLACE INTO txs VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self._db.executemany("INSERT OR REPLACE INTO tx_addresses VALUES (?, ?, ?, ?, ?)", address_rows)
+                self._db.execute("UPDATE meta SET value = ? WHERE key = 'height' AND value < ?", (height, height))
+
+    def history(self, address, type_filter=None, role=None, limit=100, offset=0):
+        """Returns indexed transactions of an address, newest first.
+
+        ``role`` can be 'sender' or 'recipient' to restrict the match.
+        """
+        sql = "SELECT t.body FROM tx_addresses a JOIN txs t ON a.tx_id = t.id WHERE a.address = ?"
+        args = [address]
+        if type_filter:
+            sql += " AND a.type = ?"
+            args.append(type_filter)
+        if role:
+            sql += " AND a.role = ?"
+            args.append(role)
+        sql += " GROUP BY t.id ORDER BY t.height DESC, t.timestamp DESC LIMIT ? OFFSET ?"
+        args += [limit, offset]
+        return self._query(sql, args)
+
+    def contract_history(self, contract_id, type_filter=None, limit=100, offset=0):
+        """Returns indexed transactions of a contract, newest first.
+        """
+        sql = "SELECT body FROM txs WHERE contract_id = ?"
+        args = [contract_id]
+        if type_filter:
+            sql += " AND type = ?"
+            args.append(type_filter)
+        sql += " ORDER BY height DESC, timestamp DESC LIMIT ? OFFSET ?"
+        args += [limit, offset]
+        return self._query(sql, args)
+
+    def tx(self, tx_id):
+        result = self._query("SELECT body FROM txs WHERE id = ?", [tx_id])
+        return result[0] if result else None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _query(self, sql, args):
+        with self._lock:
+            return [json.loads(row[0]) for row in self._db.execute(sql, args)]
@@ -0,0 +1,135 @@
+__copyright__ = "Copyright (C) 2019 Icerm"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+__doc__ = """
+:mod:`vsyspy.metrics` per-endpoint request metrics of a Wrapper.
+"""
+
+import threading
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def endpoint_name(api):
+    """Reduces an api path to its endpoint, e.g. 'blocks/at/100' to 'blocks/at/{}'.
+    """
+    path = api.split('?', 1)[0]
+    return '/'.join(part if part.isalpha() and len(part) <= 20 else '{}' for part in path.split('/'))
+
+
+class EndpointStats(object):
+    __slots__ = ('count', 'errors', 'bytes_sent', 'bytes_received', 'latency_sum', 'buckets')
+
+    def __init__(self, bucket_num):
+        self.count = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (bucket_num + 1)
+
+
+class WrapperMetrics(object):
+    """Class for WrapperMetrics.
+
+    Collects request counts, error counts, bytes transferred and latency
+    histograms per ``(method, endpoint)``.
+
+    .. attribute:: buckets
+
+        upper bounds of the latency histogram buckets, in seconds.
+
+    .. attribute:: callback
+
+        optional callable invoked after every request with
+        ``(method, endpoint, elapsed, bytes_sent, bytes_received, error)``.
+
+    """
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS, callback=None):
+        self.buckets = tuple(sorted(buckets))
+        self.callback = callback
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method, api, elapsed, bytes_sent=0, bytes_received=0, error=False):
+        endpoint = endpoint_name(api)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if elapsed <= bound:
+                index = i
+                break
+        with self._lock:
+            stats = self._stats.get((method, endpoint))
+            if stats is None:
+                stats = self._stats[(method, endpoint)] = EndpointStats(len(self.buckets))
+            stats.count += 1
+            stats.errors += 1 if error else 0
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.latency_sum += elapsed
+            stats.buckets[index] += 1
+        if self.callback:
+            self.callback(method, endpoint, elapsed, bytes_sent, bytes_received, error)
+
+    def snapshot(self):
+        """Returns ``{(method, endpoint): {...}}`` with cumulative bucket counts.
+        """
+        with self._lock:
+            result = {}
+            for key, stats in self._stats.items():
+                cumulative, total = [], 0
+                for count in stats.buckets:
+                    total += count
+                    cumulative.append(total)
+                result[key] = {"count": stats.count, "errors": stats.errors, "bytes_sent": stats.bytes_sent,
+                               "bytes_received": stats.bytes_received, "latency_sum": stats.latency_sum,
+                               "buckets": list(zip(self.buckets + (float('inf'),), cumulative))}
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def to_prometheus(self, prefix='vsyspy_wrapper'):
+        """Exports the metrics in the Prometheus text exposition format.
+        """
+        snapshot = sorted(self.snapshot().items())
+        lines = []
+        for name, field, help_text in [('requests_total', 'count', 'Requests sent.'),
+                                       ('errors_total', 'errors', 'Requests that failed.'),
+                                       ('sent_bytes_total', 'bytes_sent', 'Request body bytes sent.'),
+                                       ('received_bytes_total', 'bytes_received', 'Response bytes received.')]:
+            lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+            lines.append('# TYPE %s_%s counter' % (prefix, name))
+            for (method, endpoint), stats in snapshot:
+                lines.append('%s_%s{method="%s",endpoint="%s"} %d' % (prefix, name, method, endpoint, stats[field]))
+        name = prefix + '_request_duration_seconds'
+        lines.append('# HELP %s Request latency.' % name)
+        lines.append('# TYPE %s histogram' % name)
+        for (method, endpoint), stats in snapshot:
+            labels = 'method="%s",endpoint="%s"' % (method, endpoint)
+            for bound, count in stats["buckets"]:
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, le, count))
+            lines.append('%s_sum{%s} %f' % (name, labels, stats["latency_sum"]))
+            lines.append('%s_count{%s} %d' % (name, labels, stats["count"]))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,204 @@
+__copyright__ = "Copyright (C) 2019 Icerm"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+__doc__ = """
+:mod:`vsyspy.nodepool` pool of full nodes discovered from the connected peers.
+"""
+
+from .errors import NetworkException
+from .setting import DEFAULT_SUPER_NODE_NUM, DEFAULT_API_PORT, DEFAULT_POOL_REFRESH_INTERVAL, DEFAULT_POOL_SIZE
+from .wrapper import Wrapper
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def peer_api_host(peer_address, api_port=DEFAULT_API_PORT, scheme='http'):
+    """Turns a peer address like '/1.2.3.4:9921' or 'name/1.2.3.4:9921' into its api url.
+    """
+    host = peer_address.rsplit('/', 1)[-1].rsplit(':', 1)[0]
+    if ':' in host and not host.startswith('['):  # ipv6
+        host = '[%s]' % host
+    return '%s://%s:%d' % (scheme, host, api_port)
+
+
+class NodePool(object):
+    """Class for NodePool.
+
+    It probes the connected peers of a chain's node for an open api port and
+    keeps the fastest ones within ``max_lag`` blocks of that node. A wrapper
+    with ``node_pool`` set spreads its GETs over the pool and its own node,
+    weighted by latency, so reads may trail the node by up to ``max_lag`` blocks.
+    Broadcasts and the api key only ever go to the wrapper's own node.
+
+    .. attribute:: chain
+
+        VSYS chain object whose node's peers are discovered.
+
+    .. attribute:: api_port
+
+        api port probed on every peer, default: 9922.
+
+    .. attribute:: max_nodes
+
+        number of nodes kept, fastest first.
+
+    .. attribute:: max_lag
+
+        blocks a node may trail the chain's own node.
+
+    .. attribute:: refresh_interval
+
+        seconds between two discoveries of the background thread.
+
+    """
+    def __init__(self, chain, api_port=DEFAULT_API_PORT, max_nodes=DEFAULT_POOL_SIZE, max_lag=DEFAULT_SUPER_NODE_NUM,
+                 refresh_interval=DEFAULT_POOL_REFRESH_INTERVAL, probe_timeout=2, scheme='http'):
+        self.chain = chain
+        self.api_port = api_port
+        self.max_nodes = max_nodes
+        self.max_lag = max_lag
+        self.refresh_interval = refresh_interval
+        self.probe_timeout = probe_timeout
+        self.scheme = scheme
+        self.logger = logging.getLogger(__name__)
+        self._nodes = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._random = random.Random()
+
+    def _wrapper(self, node_host, api_key=''):
+        return Wrapper(node_host, api_key, metrics=None, timeout=self.probe_timeout, retries=0)
+
+    def probe(self, node_host):
+        """Returns ``(latency, height)`` of a node, or None if its api does not answer.
+        """
+        wrapper = self._wrapper(node_host)
+        start = time.time()
+        try:
+            resp = wrapper.request('blocks/height')
+            return time.time() - start, resp['height']
+        except (NetworkException, KeyError, TypeError, ValueError):
+            return None
+
+    def discover(self):
+        """Probes the current peers concurrently and replaces the pool with the healthy ones.
+
+        Returns the node hosts in the pool, the chain's own node included when any peer is healthy.
+        """
+        if self.chain.is_offline():
+            raise NetworkException("Cannot discover nodes in offline mode.")
+        # ask the chain's own node directly, not through the pool of its wrapper
+        own_host = self.chain.api_wrapper.node_host
+        own = self._wrapper(own_host, self.chain.api_wrapper.api_key)
+        start = time.time()
+        height = own.request('blocks/height')['height']
+        own_latency = time.time() - start
+        peers = [peer['address'] for peer in own.request('peers/connected').get('peers') or []]
+        hosts = list(set(peer_api_host(peer, self.api_port, self.scheme) for peer in peers))
+        if not hosts:
+            results = []
+        else:
+            with ThreadPoolExecutor(max_workers=min(16, len(hosts))) as executor:
+                results = list(executor.map(self.probe, hosts))
+        now = time.time()
+        nodes = {}
+        for host, result in zip(hosts, results):
+            if result is None:
+                continue
+            latency, node_height = result
+            if height - node_height > self.max_lag:
+                self.logger.info("Node {} lags {} blocks behind.".format(host, height - node_height))
+                continue
+            nodes[host] = {'latency': latency, 'height': node_height, 'checked_at': now}
+        nodes.pop(own_host, None)
+        fastest = sorted(nodes, key=lambda host: nodes[host]['latency'])[:self.max_nodes]
+        if fastest:
+            # the node itself keeps its share of the reads
+            nodes[own_host] = {'latency': own_latency, 'height': height, 'checked_at': now}
+            fastest.append(own_host)
+        with self._lock:
+            self._nodes = dict((host, nodes[host]) for host in fastest)
+        self.logger.debug("Node pool: {} of {} peers.".format(len(fastest), len(hosts)))
+        return fastest
+
+    def nodes(self):
+        """Returns a copy of the pool, keyed by node host.
+        """
+        with self._lock:
+            return dict((host, dict(info)) for host, info in self._nodes.items())
+
+    def pick(self):
+        """Returns a node host, drawn with a weight inverse to its latency, or None if the pool is empty.
+        """
+        with self._lock:
+            if not self._nodes:
+                return None
+            hosts = list(self._nodes)
+            weights = [1.0 / max(self._nodes[host]['latency'], 0.001) for host in hosts]
+        return self._random.choices(hosts, weights)[0]
+
+    def evict(self, node_host):
+        """Drops a node until the next discovery, e.g. after a failed request.
+        """
+        with self._lock:
+            return self._nodes.pop(node_host, None) is not None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='vsyspy-nodepool')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def __contains__(self, node_host):
+        with self._lock:
+            return node_host in self._nodes
+
+    def __len__(self):
+        with self._lock:
+            return len(self._nodes)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.discover()
+            except (NetworkException, KeyError) as ex:
+                self.logger.error("Failed to discover nodes. ({})".format(ex))
+            self._stop.wait(self.refresh_interval)
@@ -0,0 +1,152 @@
+__copyright__ = "Copyright (C) 2019 Icerm"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+__doc__ = """
+:mod:`vsyspy.pending` index of broadcast transactions that are not confirmed yet.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from .setting import DEFAULT_PENDING_SIZE, DEFAULT_PENDING_MAX_AGE
+
+_FIELDS = ('id', 'api', 'data', 'timestamp', 'added')
+
+
+class PendingTxIndex(object):
+    """Class for PendingTxIndex.
+
+    It keeps the locally computed id, broadcast api and json of every transaction
+    an account broadcasts until it is resolved, so a retry after a timeout can
+    look the id up on the node instead of signing a new transaction.
+
+    .. attribute:: path
+
+        SQLite database path to keep the index across restarts, default: None,
+        which keeps it in a dict.
+
+    .. attribute:: max_size
+
+        most entries kept, default: DEFAULT_PENDING_SIZE. Adding one more drops the oldest.
+        None keeps every entry.
+
+    .. attribute:: max_age
+
+        seconds an entry is kept, default: DEFAULT_PENDING_MAX_AGE. Older entries are dropped
+        whenever one is added. None keeps them until removed or pruned.
+
+    Entries of transactions that never get checked would otherwise pile up for the
+    life of the process, so both caps are on by default.
+
+    """
+    def __init__(self, path=None, max_size=DEFAULT_PENDING_SIZE, max_age=DEFAULT_PENDING_MAX_AGE):
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._db = None
+        if path is not None:
+            import sqlite3
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('''CREATE TABLE IF NOT EXISTS pending (id TEXT PRIMARY KEY, api TEXT, data TEXT,
+                                                                   timestamp INTEGER, added REAL)''')
+            self._db.execute('CREATE INDEX IF NOT EXISTS pending_added ON pending (added)')
+            self._db.commit()
+
+    def add(self, tx_id, api, data, timestamp):
+        now = time.time()
+        entry = (tx_id, api, data, timestamp, now)
+        before = now - self.max_age if self.max_age is not None else None
+        with self._lock:
+            if self._db is None:
+                entries = self._entries
+                entries.setdefault(tx_id, entry)
+                # entries are in insertion order, so the oldest come first
+                while entries and (self.max_size is not None and len(entries) > self.max_size or
+                                   before is not None and next(iter(entries.values()))[4] < before):
+                    entries.popitem(last=False)
+                return
+            with self._db:
+                self._db.execute("INSERT OR IGNORE INTO pending VALUES (?, ?, ?, ?, ?)", entry)
+                if before is not None:
+                    self._db.execute("DELETE FROM pending WHERE added < ?", (before,))
+                if self.max_size is not None:
+                    self._db.execute('''DELETE FROM pending WHERE added <=
+                                        (SELECT added FROM pending ORDER BY added DESC LIMIT 1 OFFSET ?)''',
+                                     (self.max_size,))
+
+    def get(self, tx_id):
+        with self._lock:
+            if self._db is None:
+                entry = self._entries.get(tx_id)
+            else:
+                entry = self._db.execute("SELECT * FROM pending WHERE id = ?", (tx_id,)).fetchone()
+        return dict(zip(_FIELDS, entry)) if entry else None
+
+    def remove(self, tx_id):
+        with self._lock:
+            if self._db is None:
+                return self._entries.pop(tx_id, None) is not None
+            with self._db:
+                return self._db.execute("DELETE FROM pending WHERE id = ?", (tx_id,)).rowcount > 0
+
+    def items(self, older_than=None):
+        """Returns pending entries, oldest first.
+
+        ``older_than`` restricts them to entries added more than that many seconds ago.
+        """
+        before = time.time() - older_than if older_than is not None else None
+        with self._lock:
+            if self._db is None:
+                entries = sorted(self._entries.values(), key=lambda entry: entry[4])
+            else:
+                entries = self._db.execute("SELECT * FROM pending ORDER BY added").fetchall()
+        return [dict(zip(_FIELDS, entry)) for entry in entries if before is None or entry[4] < before]
+
+    def prune(self, max_age):
+        """Drops entries added more than ``max_age`` seconds ago and returns how many were dropped.
+        """
+        before = time.time() - max_age
+        with self._lock:
+            if self._db is None:
+                old = [tx_id for tx_id, entry in self._entries.items() if entry[4] < before]
+                for tx_id in old:
+                    del self._entries[tx_id]
+                return len(old)
+            with self._db:
+                return self._db.execute("DELETE FROM pending WHERE added < ?", (before,)).rowcount
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+
+    def __contains__(self, tx_id):
+        return self.get(tx_id) is not None
+
+    def __len__(self):
+        with self._lock:
+            if self._db is None:
+                return len(self._entries)
+            return self._db.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
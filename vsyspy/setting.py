@@ -2,6 +2,18 @@ VSYS = 100000000
 DEFAULT_TX_FEE = int(0.1 * VSYS)
 DEFAULT_FEE_SCALE = 100
 DEFAULT_SUPER_NODE_NUM = 15
+DEFAULT_QUERY_WORKERS = 8
+DEFAULT_REQUEST_TIMEOUT = 30
+DEFAULT_READ_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = 0.2
+DEFAULT_HEDGE_PERCENTILE = 0.95
+DEFAULT_HEALTH_INTERVAL = 4
+DEFAULT_HEALTH_STALL_TIMEOUT = 60
+DEFAULT_API_PORT = 9922
+DEFAULT_POOL_REFRESH_INTERVAL = 60
+DEFAULT_POOL_SIZE = 8
+DEFAULT_PENDING_SIZE = 10000
+DEFAULT_PENDING_MAX_AGE = 24 * 3600
 
 DEFAULT_PAYMENT_FEE = DEFAULT_TX_FEE
 DEFAULT_LEASE_FEE = DEFAULT_TX_FEE
@@ -17,8 +29,12 @@ MAX_DB_KEY_SIZE = 30
 MIN_DB_KEY_SIZE = 1
 MAX_NONCE = 4294967295
 MAX_TX_HISTORY_LIMIT = 10000
+DEFAULT_TX_HISTORY_PAGE_SIZE = 100
 MIN_CONTEND_SLOT_BALANCE = 1000000 * VSYS
+SLOT_COUNT = 60
 MIN_CONTRACT_BYTE_SIZE = 8
+CONTRACT_CACHE_SIZE = 128
+TOKEN_ID_CACHE_SIZE = 4096
 
 THROW_EXCEPTION_ON_ERROR = True
 CHECK_FEE_SCALE = True
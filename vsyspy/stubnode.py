@@ -0,0 +1,368 @@
+__copyright__ = "Copyright (C) 2019 Icerm"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+__doc__ = """
+:mod:`vsyspy.stubnode` local stand-in VSYS full node for load and latency testing.
+"""
+
+from .setting import *
+from .chain import Chain
+from .crypto import bytes2str, str2bytes, transaction_id
+from .transaction import signing_bytes
+
+import base58
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+except ImportError:  # python2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+
+BROADCAST_TX_TYPES = {
+    'vsys/broadcast/payment': PAYMENT_TX_TYPE,
+    'leasing/broadcast/lease': LEASE_TX_TYPE,
+    'leasing/broadcast/cancel': LEASE_CANCEL_TX_TYPE,
+    'spos/broadcast/contend': CONTEND_SLOT_TX_TYPE,
+    'spos/broadcast/release': RELEASE_SLOT_TX_TYPE,
+    'contract/broadcast/register': REGISTER_CONTRACT_TX_TYPE,
+    'contract/broadcast/execute': EXECUTE_CONTRACT_FUNCTION_TX_TYPE,
+    'database/broadcast/put': DBPUT_TX_TYPE,
+}
+
+
+class StubNode(object):
+    """Class for StubNode.
+
+    An in-process HTTP server answering the full node endpoints vsyspy calls
+    with synthetic chain data. Blocks are produced every ``block_interval``
+    seconds and carry the transactions broadcast since the previous block.
+
+    .. attribute:: block_interval
+
+        seconds between two blocks.
+
+    .. attribute:: latency
+
+        seconds added to every response, a number or a ``(min, max)`` range.
+
+    .. attribute:: error_rate
+
+        fraction of requests answered with an HTTP 500 error.
+
+    .. attribute:: balance
+
+        balance reported for every address.
+
+    .. attribute:: peers
+
+        peer addresses reported by ``peers/connected``, e.g. '/127.0.0.1:9921'.
+
+    """
+    def __init__(self, host='127.0.0.1', port=0, block_interval=4.0, latency=0, error_rate=0.0,
+                 initial_height=1, balance=10000 * VSYS, chain_id=TESTNET_CHAIN_ID, seed=None, peers=None):
+        self.chain = Chain('stub', chain_id, ADDRESS_VERSION, None)
+        self.block_interval = block_interval
+        self.latency = latency
+        self.error_rate = error_rate
+        self.balance = balance
+        self.peers = peers if peers is not None else ['/127.0.0.1:9921']
+        self.random = random.Random(seed)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._blocks = []
+        self._txs = {}
+        self._utx = []
+        self._start = time.time()
+        for height in range(1, initial_height + 1):
+            self._produce_block(height)
+        self._initial_height = initial_height
+        self._server = _ThreadingHTTPServer((host, port), _StubNodeHandler)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def node_host(self):
+        return 'http://%s:%d' % self._server.server_address[:2]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def height(self):
+        with self._lock:
+            self._advance()
+            return len(self._blocks)
+
+    def handle(self, method, path, body=None):
+        """Returns ``(status, response)`` of one api call.
+        """
+        with self._lock:
+            self.requests += 1
+            self._advance()
+            if self.error_rate and self.random.random() < self.error_rate:
+                return 500, {"error": 0, "message": "Injected error"}
+            if method == 'POST':
+                return self._broadcast(path, body)
+            for pattern, handler in _ROUTES:
+                match = pattern.match(path)
+                if match:
+                    return handler(self, *match.groups())
+            return 404, {"error": 404, "message": "Unknown api %s" % path}
+
+    def delay(self):
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            latency = self.random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+    def _advance(self):
+        target = self._initial_height
+        if self.block_interval:
+            target += int((time.time() - self._start) / self.block_interval)
+        while len(self._blocks) < target:
+            self._produce_block(len(self._blocks) + 1)
+
+    def _produce_block(self, height):
+        txs, self._utx = self._utx, []
+        for tx in txs:
+            tx["status"] = "Success"
+            tx["height"] = height
+        self._blocks.append({
+            "version": 1,
+            "timestamp": int(time.time() * 1000000000),
+            "reference": _fake_id(height - 1),
+            "height": height,
+            "generator": "stub",
+            "transactionCount": len(txs),
+            "transactions": txs,
+            "signature": _fake_id(height),
+        })
+
+    def _broadcast(self, path, body):
+        tx_type = BROADCAST_TX_TYPES.get(path)
+        if tx_type is None:
+            return 404, {"error": 404, "message": "Unknown api %s" % path}
+        try:
+            tx = json.loads(body)
+        except ValueError:
+            return 400, {"error": 1, "message": "failed to parse json message"}
+        tx["type"] = tx_type
+        try:
+            tx["id"] = transaction_id(signing_bytes(tx))
+        except (KeyError, TypeError, ValueError):
+            tx["id"] = bytes2str(base58.b58encode(hashlib.sha256(str2bytes(body)).digest()))
+        public_key = tx.pop("senderPublicKey", "")
+        try:
+            address = self.chain.public_key_to_address(base58.b58decode(public_key))
+        except ValueError:
+            address = ""
+        tx["proofs"] = [{"proofType": "Curve25519", "publicKey": public_key, "address": address,
+                         "signature": tx.pop("signature", "")}]
+        if tx_type == REGISTER_CONTRACT_TX_TYPE:
+            tx["contractId"] = _fake_id(tx["id"])[:35]
+        self._txs[tx["id"]] = tx
+        self._utx.append(tx)
+        return 200, tx
+
+    def _height(self):
+        return 200, {"height": len(self._blocks)}
+
+    def _last(self):
+        return 200, self._blocks[-1]
+
+    def _block_at(self, height):
+        height = int(height)
+        if 1 <= height <= len(self._blocks):
+            return 200, self._blocks[height - 1]
+        return 200, {"status": "error", "details": "No block for this height"}
+
+    def _tx_info(self, tx_id):
+        tx = self._txs.get(tx_id)
+        if tx is None or "height" not in tx:
+            return 200, {"status": "error", "details": "Transaction is not in blockchain"}
+        return 200, tx
+
+    def _unconfirmed_info(self, tx_id):
+        for tx in self._utx:
+            if tx["id"] == tx_id:
+                return 200, tx
+        return 200, {"status": "error", "details": "Transaction is not in UTX"}
+
+    def _unconfirmed(self):
+        return 200, list(self._utx)
+
+    def _unconfirmed_size(self):
+        return 200, {"size": len(self._utx)}
+
+    def _slot_info(self, slot_id):
+        return 200, {"slotId": int(slot_id), "address": "stub",
+                     "mintingAverageBalance": MIN_CONTEND_SLOT_BALANCE + int(slot_id)}
+
+    def _all_slots_info(self):
+        return 200, [{"height": len(self._blocks)}] + [self._slot_info(i)[1] for i in range(SLOT_COUNT)]
+
+    def _peers(self):
+        return 200, {"peers": [{"address": address, "declaredAddress": "N/A", "peerName": "stub", "peerNonce": i + 1,
+                                "applicationName": "VSYS", "applicationVersion": "0.3.0"}
+                               for i, address in enumerate(self.peers)]}
+
+    def _address_balance(self, address, confirmations=None):
+        return 200, {"address": address, "confirmations": int(confirmations or 0), "balance": self.balance}
+
+    def _balance_details(self, address):
+        return 200, {"address": address, "regular": self.balance, "mintingAverage": self.balance,
+                     "available": self.balance, "effective": self.balance, "height": len(self._blocks)}
+
+    def _address_txs(self, address):
+        return [tx for block in reversed(self._blocks) for tx in reversed(block["transactions"])
+                if tx.get("recipient") == address or tx.get("proofs", [{}])[0].get("address") == address]
+
+    def _tx_history(self, address, limit):
+        return 200, [self._address_txs(address)[:int(limit)]]
+
+    def _tx_list(self, query):
+        params = parse_qs(query or '')
+        address = params.get('address', [''])[0]
+        tx_type = params.get('txType')
+        limit = int(params.get('limit', ['100'])[0])
+        offset = int(params.get('offset', ['0'])[0])
+        txs = self._address_txs(address)
+        if tx_type:
+            txs = [tx for tx in txs if tx["type"] == int(tx_type[0])]
+        page = txs[offset:offset + limit]
+        return 200, {"totalCount": len(txs), "size": len(page), "transactions": page}
+
+    def _contract_data(self, contract_id, key):
+        return 200, {"contractId": contract_id, "key": key, "height": len(self._blocks), "dbName": "contract",
+                     "dataType": "Amount", "value": 0}
+
+    def _token_balance(self, address, token_id):
+        return 200, {"address": address, "height": len(self._blocks), "tokenId": token_id, "balance": 0,
+                     "unity": 1}
+
+
+_ROUTES = [(re.compile(pattern), handler) for pattern, handler in [
+    (r'^blocks/height$', StubNode._height),
+    (r'^blocks/last$', StubNode._last),
+    (r'^blocks/at/(\d+)$', StubNode._block_at),
+    (r'^transactions/info/([^/]+)$', StubNode._tx_info),
+    (r'^transactions/unconfirmed/info/([^/]+)$', StubNode._unconfirmed_info),
+    (r'^transactions/unconfirmed/size$', StubNode._unconfirmed_size),
+    (r'^transactions/unconfirmed$', StubNode._unconfirmed),
+    (r'^transactions/address/([^/]+)/limit/(\d+)$', StubNode._tx_history),
+    (r'^transactions/list\??(.*)$', StubNode._tx_list),
+    (r'^consensus/slotInfo/(\d+)$', StubNode._slot_info),
+    (r'^consensus/allSlotsInfo$', StubNode._all_slots_info),
+    (r'^peers/connected$', StubNode._peers),
+    (r'^addresses/balance/details/([^/]+)$', StubNode._balance_details),
+    (r'^addresses/balance/([^/]+)(?:/(\d+))?$', StubNode._address_balance),
+    (r'^contract/data/([^/]+)/([^/]+)$', StubNode._contract_data),
+    (r'^contract/balance/([^/]+)/([^/]+)$', StubNode._token_balance),
+]]
+
+
+def _fake_id(seed):
+    return bytes2str(base58.b58encode(hashlib.sha256(str2bytes(str(seed))).digest()))
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # a short listen backlog would add the stub's own queueing to the client latencies being measured
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # clients giving up on a slow response, e.g. after a timeout, are expected here
+        if not isinstance(sys.exc_info()[1], (IOError, OSError)):
+            HTTPServer.handle_error(self, request, client_address)
+
+
+class _StubNodeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._reply(self.server.stub.handle('GET', self.path.lstrip('/')))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8')
+        self._reply(self.server.stub.handle('POST', self.path.lstrip('/'), body))
+
+    def _reply(self, result):
+        status, response = result
+        self.server.stub.delay()
+        body = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Local stand-in VSYS full node.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9922)
+    parser.add_argument('--block-interval', type=float, default=4.0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    node = StubNode(args.host, args.port, block_interval=args.block_interval, latency=args.latency,
+                    error_rate=args.error_rate)
+    print("Serving stub node on %s" % node.node_host)
+    node.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        node.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+__copyright__ = "Copyright (C) 2019 Icerm"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+__doc__ = """
+:mod:`vsyspy.throttle` client side rate limits, adaptive concurrency control and request coalescing.
+"""
+
+import threading
+import time
+from copy import deepcopy
+
+from .errors import NetworkException
+
+
+class TokenBucket(object):
+    """Class for TokenBucket.
+
+    Allows ``rate`` requests per second on average with bursts of up to
+    ``burst`` requests. ``acquire`` blocks until a token is available.
+
+    .. attribute:: rate
+
+        tokens added per second.
+
+    .. attribute:: burst
+
+        bucket capacity.
+
+    """
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("Rate must be > 0")
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.burst
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, tokens=1):
+        with self._lock:
+            self._refill(time.time())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1, timeout=None):
+        """Waits for the tokens. Returns False if they are not available within ``timeout`` seconds.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            with self._lock:
+                now = time.time()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                if now + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+
+class AIMDLimiter(object):
+    """Class for AIMDLimiter.
+
+    Bounds the number of requests in flight and adapts the bound to the node:
+    every fast success raises the limit by ``increase / limit`` (about one per
+    round of requests), every congestion signal (a transport failure, a timeout or
+    a 5xx answer) or response slower than ``latency_target`` multiplies it by
+    ``decrease``. A 4xx answer is the caller's mistake, not load, and counts as a success.
+
+    .. attribute:: limit
+
+        current number of requests allowed in flight.
+
+    """
+    def __init__(self, initial=8, min_limit=1, max_limit=64, latency_target=1.0, increase=1.0, decrease=0.5):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.increase = increase
+        self.decrease = decrease
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """Waits for a free slot. Returns False if none frees up within ``timeout`` seconds.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._cond:
+            while self.in_flight >= max(self.min_limit, int(self.limit)):
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, elapsed, congested=False):
+        with self._cond:
+            self.in_flight -= 1
+            if congested or elapsed > self.latency_target:
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+            else:
+                self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            self._cond.notify_all()
+
+
+class _Flight(object):
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Class for SingleFlight.
+
+    Coalesces concurrent calls with the same key: the first caller runs the
+    call, callers arriving while it is in flight wait for it and get a copy
+    of its result (or its exception).
+
+    .. attribute:: saved
+
+        number of calls answered by another caller's flight.
+
+    """
+    def __init__(self):
+        self.saved = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, timeout=None):
+        """Runs ``func(*args)`` or joins the call in flight for ``key``.
+
+        A caller joining another call waits at most ``timeout`` seconds for it.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.saved += 1
+        if not leader:
+            if not flight.done.wait(timeout):
+                raise NetworkException('Failed to get response: deadline of {}s exceeded'.format(timeout))
+            if flight.error is not None:
+                raise flight.error
+            return deepcopy(flight.result)
+        try:
+            flight.result = func(*args)
+            return flight.result
+        except Exception as ex:
+            flight.error = ex
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
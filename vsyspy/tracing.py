@@ -0,0 +1,141 @@
+__copyright__ = "Copyright (C) 2019 Icerm"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+__doc__ = """
+:mod:`vsyspy.tracing` pluggable timing hooks around vsyspy hot paths.
+
+Spans are opened around hashing ('hash'), signing ('sign'), tx serialization
+('serialize'), json encoding ('json'), http requests ('network'), address
+validation ('validate_address') and contract parsing ('contract_parse').
+While no tracer is installed a span costs one global lookup.
+"""
+
+import threading
+import time
+
+_tracer = None
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ('tracer', 'name', 'start')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.tracer(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def span(name):
+    """Returns a context manager timing the ``name`` phase for the installed tracer.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return _Span(tracer, name)
+
+
+def set_tracer(tracer):
+    """Installs ``tracer(name, elapsed_seconds)``, called when each span ends. None disables tracing.
+    """
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer():
+    return _tracer
+
+
+class PhaseAggregator(object):
+    """Class for PhaseAggregator.
+
+    A tracer summing the time spent per phase. Spans nest, e.g. 'hash' runs
+    inside 'validate_address', so phase times are inclusive.
+
+    Use it as a context manager to install it for a block of code::
+
+        with PhaseAggregator() as phases:
+            account.send_payment(recipient, amount)
+        print(phases.report())
+
+    """
+    def __init__(self):
+        self._phases = {}
+        self._lock = threading.Lock()
+        self._previous = None
+
+    def __call__(self, name, elapsed):
+        with self._lock:
+            phase = self._phases.get(name)
+            if phase is None:
+                self._phases[name] = [1, elapsed, elapsed]
+            else:
+                phase[0] += 1
+                phase[1] += elapsed
+                if elapsed > phase[2]:
+                    phase[2] = elapsed
+
+    def __enter__(self):
+        self._previous = get_tracer()
+        set_tracer(self)
+        return self
+
+    def __exit__(self, *args):
+        set_tracer(self._previous)
+        return False
+
+    def phases(self):
+        """Returns ``{name: (count, total_seconds, max_seconds)}``.
+        """
+        with self._lock:
+            return dict((name, tuple(phase)) for name, phase in self._phases.items())
+
+    def reset(self):
+        with self._lock:
+            self._phases = {}
+
+    def report(self):
+        phases = sorted(self.phases().items(), key=lambda item: -item[1][1])
+        lines = ['%-18s %10s %12s %12s %12s' % ('phase', 'count', 'total ms', 'mean us', 'max us')]
+        for name, (count, total, longest) in phases:
+            lines.append('%-18s %10d %12.3f %12.1f %12.1f' % (name, count, total * 1e3, total / count * 1e6,
+                                                               longest * 1e6))
+        return '\n'.join(lines)
@@ -0,0 +1,200 @@
+__copyright__ = "Copyright (C) 2019 Icerm"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+__doc__ = """
+:mod:`vsyspy.transaction` signing bytes layouts of vsys transactions.
+"""
+
+from .crypto import str2bytes, verify_many
+from .setting import *
+from .tracing import span
+
+import struct
+import base58
+
+
+def payment_bytes(recipient, amount, attachment, tx_fee, fee_scale, timestamp):
+    return struct.pack(">B", PAYMENT_TX_TYPE) + \
+           struct.pack(">Q", timestamp) + \
+           struct.pack(">Q", amount) + \
+           struct.pack(">Q", tx_fee) + \
+           struct.pack(">H", fee_scale) + \
+           base58.b58decode(recipient) + \
+           struct.pack(">H", len(attachment)) + \
+           attachment
+
+
+def lease_bytes(recipient, amount, tx_fee, fee_scale, timestamp):
+    return struct.pack(">B", LEASE_TX_TYPE) + \
+           base58.b58decode(recipient) + \
+           struct.pack(">Q", amount) + \
+           struct.pack(">Q", tx_fee) + \
+           struct.pack(">H", fee_scale) + \
+           struct.pack(">Q", timestamp)
+
+
+def cancel_lease_bytes(lease_id, tx_fee, fee_scale, timestamp):
+    return struct.pack(">B", LEASE_CANCEL_TX_TYPE) + \
+           struct.pack(">Q", tx_fee) + \
+           struct.pack(">H", fee_scale) + \
+           struct.pack(">Q", timestamp) + \
+           base58.b58decode(lease_id)
+
+
+def slot_bytes(tx_type, slot_id, tx_fee, fee_scale, timestamp):
+    return struct.pack(">B", tx_type) + \
+           struct.pack(">I", slot_id) + \
+           struct.pack(">Q", tx_fee) + \
+           struct.pack(">H", fee_scale) + \
+           struct.pack(">Q", timestamp)
+
+
+def dbput_bytes(db_key, db_data, data_type_id, tx_fee, fee_scale, timestamp):
+    return struct.pack(">B", DBPUT_TX_TYPE) + \
+           struct.pack(">H", len(db_key)) + \
+           db_key + \
+           struct.pack(">H", len(db_data) + 1) + \
+           data_type_id + \
+           db_data + \
+           struct.pack(">Q", tx_fee) + \
+           struct.pack(">H", fee_scale) + \
+           struct.pack(">Q", timestamp)
+
+
+def register_contract_bytes(contract_bytes, data_stack_bytes, description, tx_fee, fee_scale, timestamp):
+    return struct.pack(">B", REGISTER_CONTRACT_TX_TYPE) + \
+           struct.pack(">H", len(contract_bytes)) + \
+           contract_bytes + \
+           struct.pack(">H", len(data_stack_bytes)) + \
+           data_stack_bytes + \
+           struct.pack(">H", len(description)) + \
+           description + \
+           struct.pack(">Q", tx_fee) + \
+           struct.pack(">H", fee_scale) + \
+           struct.pack(">Q", timestamp)
+
+
+def execute_contract_bytes(contract_id, func_id, data_stack_bytes, attachment, tx_fee, fee_scale, timestamp):
+    return struct.pack(">B", EXECUTE_CONTRACT_FUNCTION_TX_TYPE) + \
+           base58.b58decode(contract_id) + \
+           struct.pack(">H", func_id) + \
+           struct.pack(">H", len(data_stack_bytes)) + \
+           data_stack_bytes + \
+           struct.pack(">H", len(attachment)) + \
+           attachment + \
+           struct.pack(">Q", tx_fee) + \
+           struct.pack(">H", fee_scale) + \
+           struct.pack(">Q", timestamp)
+
+
+def _fee(tx):
+    return tx['fee'], tx['feeScale'], tx['timestamp']
+
+
+def _contract_bytes(contract):
+    # broadcast json carries the base58 contract, node json the decoded contract object
+    if not isinstance(contract, dict):
+        return base58.b58decode(contract)
+    from .contract import Contract
+    textual = contract['textual']
+    c = Contract()
+    c.language_code = str2bytes(contract['languageCode'])
+    c.language_version = struct.pack(">I", contract['languageVersion'])
+    c.trigger = [base58.b58decode(x) for x in contract['triggers']]
+    c.descriptor = [base58.b58decode(x) for x in contract['descriptors']]
+    c.state_variable = [base58.b58decode(x) for x in contract['stateVariables']]
+    c.state_map = [base58.b58decode(x) for x in contract.get('stateMaps') or []]
+    c.textual = [base58.b58decode(textual[key]) for key in ('triggers', 'descriptors', 'stateVariables')]
+    if textual.get('stateMaps'):
+        c.textual.append(base58.b58decode(textual['stateMaps']))
+    return c.bytes
+
+
+def _dbput_from_json(tx):
+    # broadcast json carries "dataType"/"data", node json an "entry" object
+    entry = tx.get('entry') or {'type': tx.get('dataType'), 'data': tx.get('data')}
+    if entry['type'] != "ByteArray":
+        raise ValueError('Unsupported data type: {}'.format(entry['type']))
+    return dbput_bytes(str2bytes(tx['dbKey']), str2bytes(entry['data']), b'\x01', *_fee(tx))
+
+
+_signing_bytes_builders = {
+    PAYMENT_TX_TYPE: lambda tx: payment_bytes(tx['recipient'], tx['amount'],
+                                              base58.b58decode(tx.get('attachment') or ''), *_fee(tx)),
+    LEASE_TX_TYPE: lambda tx: lease_bytes(tx['recipient'], tx['amount'], *_fee(tx)),
+    LEASE_CANCEL_TX_TYPE: lambda tx: cancel_lease_bytes(tx.get('leaseId') or tx['txId'], *_fee(tx)),
+    CONTEND_SLOT_TX_TYPE: lambda tx: slot_bytes(CONTEND_SLOT_TX_TYPE, tx['slotId'], *_fee(tx)),
+    RELEASE_SLOT_TX_TYPE: lambda tx: slot_bytes(RELEASE_SLOT_TX_TYPE, tx['slotId'], *_fee(tx)),
+    DBPUT_TX_TYPE: _dbput_from_json,
+    REGISTER_CONTRACT_TX_TYPE: lambda tx: register_contract_bytes(_contract_bytes(tx['contract']),
+                                                                  base58.b58decode(tx.get('initData') or ''),
+                                                                  str2bytes(tx.get('description') or ''), *_fee(tx)),
+    EXECUTE_CONTRACT_FUNCTION_TX_TYPE: lambda tx: execute_contract_bytes(tx['contractId'], tx['functionIndex'],
+                                                                         base58.b58decode(tx.get('functionData') or ''),
+                                                                         base58.b58decode(tx.get('attachment') or ''),
+                                                                         *_fee(tx)),
+}
+
+
+def signing_bytes(tx, tx_type=None):
+    """Rebuilds the bytes a transaction was signed over from its json.
+
+    Both the node json (``type`` and ``proofs``) and the broadcast json built by
+    ``Account`` are accepted; broadcast json has no ``type``, so pass ``tx_type``.
+    Returns None for transaction types that carry no sender signature.
+    """
+    builder = _signing_bytes_builders.get(tx_type or tx.get('type'))
+    if builder is None:
+        return None
+    with span('serialize'):
+        return builder(tx)
+
+
+def tx_signature(tx):
+    """Returns the (public_key, signature) pair of a transaction json.
+    """
+    proofs = tx.get('proofs')
+    if proofs:
+        return proofs[0].get('publicKey'), proofs[0].get('signature')
+    return tx.get('senderPublicKey'), tx.get('signature')
+
+
+def verify_txs(txs, tx_type=None, max_workers=None):
+    """Verifies the sender signatures of many transaction jsons, e.g. a block's transactions.
+
+    Returns a list aligned with ``txs``: True or False for each verified
+    transaction, None where the type is unsupported or the json is incomplete.
+    """
+    results = [None] * len(txs)
+    positions, items = [], []
+    for i, tx in enumerate(txs):
+        public_key, signature = tx_signature(tx)
+        try:
+            message = signing_bytes(tx, tx_type)
+        except (KeyError, TypeError, ValueError):
+            message = None
+        if message is not None and public_key and signature:
+            positions.append(i)
+            items.append((public_key, message, signature))
+    for i, valid in zip(positions, verify_many(items, max_workers)):
+        results[i] = valid
+    return results
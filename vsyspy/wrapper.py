@@ -25,37 +25,286 @@ __doc__ = """
 """
 
 import os
+import time
+import random
 import logging
-import requests
+import threading
+from collections import deque
+from concurrent.futures import Future, as_completed, wait
 
-from requests.exceptions import RequestException
-from .errors import NetworkException
+from .crypto import LazyModule
+from .errors import NetworkException, InvalidResponseException
+from .setting import DEFAULT_REQUEST_TIMEOUT, DEFAULT_READ_RETRIES, DEFAULT_RETRY_BACKOFF, DEFAULT_HEDGE_PERCENTILE
+from .metrics import WrapperMetrics
+from .throttle import TokenBucket, SingleFlight
+from .tracing import span
+
+requests = LazyModule('requests')
+
+HEDGE_MIN_SAMPLES = 20
+HEDGE_WINDOW = 200
+
+# default of ``metrics``, so that an explicit None can turn them off
+_NEW_METRICS = object()
+
+
+class _ServerError(Exception):
+    """A 5xx answer to a GET, retried like a network failure."""
+    def __init__(self, result):
+        Exception.__init__(self, result)
+        self.result = result
+
+
+def _spawn(func, *args, **kwargs):
+    # a thread per call: a shared executor would queue primaries and count the queueing as latency
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as ex:
+            future.set_exception(ex)
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return future
 
 
 class Wrapper(object):
     """Class for VSYS chain api wrapper.
+
+    .. attribute:: node_host
+
+        full node api url.
+
+    .. attribute:: api_key
+
+        full node api key.
+
+    .. attribute:: cassette
+
+        optional :class:`vsyspy.cassette.Cassette` recording or replaying the traffic.
+
+    .. attribute:: metrics
+
+        :class:`vsyspy.metrics.WrapperMetrics` of the requests sent, a new one by default.
+        None disables them.
+
+    .. attribute:: rate_limits
+
+        ``{'read': TokenBucket, 'broadcast': TokenBucket}`` applied to GET and POST requests.
+
+    .. attribute:: concurrency_limiter
+
+        optional :class:`vsyspy.throttle.AIMDLimiter` bounding the requests in flight.
+
+    .. attribute:: timeout
+
+        deadline in seconds of one request, retries included. None waits forever.
+
+    .. attribute:: retries
+
+        retries of a failed GET (network error or 5xx), with exponential backoff
+        and jitter starting at ``backoff`` seconds. POST requests are never retried.
+
+    .. attribute:: hedge_node_host
+
+        optional second node. A GET still unanswered the ``hedge_percentile`` latency
+        of recent GETs after it was sent is sent there as well and the first answer wins.
+
+    .. attribute:: node_pool
+
+        optional :class:`vsyspy.nodepool.NodePool`. GETs are spread over its nodes
+        and fall back to ``node_host`` while it is empty; a node that fails is evicted.
+        GETs made with ``pinned=True`` always go to ``node_host``.
+
+    .. attribute:: coalesce_reads
+
+        when True, concurrent identical GETs share one in flight request.
+        ``requests_saved`` counts the requests this avoided.
+
+    Rate limits and the concurrency limiter belong to the wrapper, so they are
+    shared by every Chain and Account using it. A wrapper is thread safe: every
+    request uses its own connection and all shared state is guarded by locks.
+
     """
-    def __init__(self, node_host, api_key=''):
+    def __init__(self, node_host, api_key='', cassette=None, metrics=_NEW_METRICS, timeout=DEFAULT_REQUEST_TIMEOUT,
+                 retries=DEFAULT_READ_RETRIES, hedge_node_host=None):
         self.node_host = node_host
         self.api_key = api_key
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = DEFAULT_RETRY_BACKOFF
+        self.hedge_node_host = hedge_node_host
+        self.hedge_percentile = DEFAULT_HEDGE_PERCENTILE
+        self.hedged_requests = 0
+        self.node_pool = None
+        self.coalesce_reads = True
+        self._single_flight = SingleFlight()
+        self._latencies = deque(maxlen=HEDGE_WINDOW)
+        self._hedge_lock = threading.Lock()
+        self.cassette = cassette
+        self.metrics = WrapperMetrics() if metrics is _NEW_METRICS else metrics
+        self.rate_limits = {'read': None, 'broadcast': None}
+        self.concurrency_limiter = None
         self.logger = logging.getLogger(__name__)
 
-    def request(self, api, post_data=''):
+    def set_rate_limit(self, read_rate=None, broadcast_rate=None, burst=None):
+        """Limits reads and broadcasts to the given requests per second. None removes a limit.
+        """
+        self.rate_limits = {'read': TokenBucket(read_rate, burst) if read_rate else None,
+                            'broadcast': TokenBucket(broadcast_rate, burst) if broadcast_rate else None}
+
+    @property
+    def requests_saved(self):
+        return self._single_flight.saved
+
+    def request(self, api, post_data='', timeout=None, pinned=False):
+        if not post_data and self.coalesce_reads:
+            return self._single_flight.do((api, pinned), self._request, api, post_data, timeout, pinned,
+                                          timeout=timeout or self.timeout)
+        return self._request(api, post_data, timeout, pinned)
+
+    def request_async(self, api, post_data='', timeout=None, pinned=False):
+        """Returns an asyncio future of ``request``, run in the event loop's default executor.
+
+        Concurrent identical GETs from coroutines and threads are coalesced alike.
+        """
+        import asyncio
+        return asyncio.get_event_loop().run_in_executor(None, self.request, api, post_data, timeout, pinned)
+
+    def _request(self, api, post_data, timeout, pinned=False):
+        cassette = self.cassette
+        if cassette is None:
+            return self._call(api, post_data, timeout, pinned)
+        if cassette.replaying:
+            return cassette.replay(api, post_data)
+        start = time.time()
+        try:
+            response = self._call(api, post_data, timeout, pinned)
+        except NetworkException as ex:
+            cassette.record(api, post_data, elapsed=time.time() - start, error=str(ex))
+            raise
+        cassette.record(api, post_data, response, time.time() - start)
+        return response
+
+    def _call(self, api, post_data, timeout, pinned=False):
+        timeout = timeout or self.timeout
+        deadline = time.time() + timeout if timeout else None
+        retries = 0 if post_data else self.retries
+        attempt = 0
+        # read once, stop_node_pool may reset it while the request is in flight
+        pool = None if post_data or pinned else self.node_pool
+        while True:
+            remaining = deadline - time.time() if deadline else None
+            if remaining is not None and remaining <= 0:
+                raise NetworkException('Failed to get response: deadline of {}s exceeded'.format(timeout))
+            node_host = (pool.pick() or self.node_host) if pool is not None else self.node_host
+            try:
+                if not post_data and self.hedge_node_host:
+                    return self._hedged_get(node_host, api, remaining)
+                return self._send(node_host, api, post_data, remaining)
+            except InvalidResponseException:
+                raise
+            except (NetworkException, _ServerError) as ex:
+                if node_host != self.node_host:
+                    pool.evict(node_host)
+                delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                attempt += 1
+                if attempt > retries or (deadline and time.time() + delay >= deadline):
+                    if isinstance(ex, _ServerError):
+                        return ex.result
+                    raise
+                self.logger.debug("Retrying %s in %.3fs after: %s" % (api, delay, ex))
+                time.sleep(delay)
+
+    def _hedge_delay(self):
+        latencies = sorted(self._latencies)
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return latencies[int(self.hedge_percentile * (len(latencies) - 1))]
+
+    def _hedged_get(self, node_host, api, timeout):
+        delay = self._hedge_delay()
+        if delay is None:
+            return self._send(node_host, api, '', timeout)
+        deadline = time.time() + timeout if timeout else None
+        sent = threading.Event()
+        primary = _spawn(self._send, node_host, api, '', timeout, on_sent=sent.set)
+        primary.add_done_callback(lambda future: sent.set())
+        # the delay starts once the primary is sent, not while it waits for a rate limit or a slot
+        sent.wait(timeout)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        with self._hedge_lock:
+            self.hedged_requests += 1
+        backup = _spawn(self._send, self.hedge_node_host, api, '', deadline - time.time() if deadline else None)
+        first_error = None
+        for future in as_completed([primary, backup]):
+            try:
+                return future.result()
+            except (NetworkException, _ServerError) as ex:
+                first_error = first_error or ex
+        raise first_error
+
+    def _send(self, node_host, api, post_data, timeout=None, on_sent=None):
+        deadline = time.time() + timeout if timeout else None
         headers = {}
-        url = os.path.join(self.node_host, api)
-        if self.api_key:
+        url = os.path.join(node_host, api)
+        # the api key is never sent to nodes of the pool
+        if self.api_key and (node_host == self.node_host or node_host == self.hedge_node_host):
             headers['api_key'] = self.api_key
-        header_str = ' '.join(['--header \'{}: {}\''.format(k, v) for k, v in headers.items()])
+        method = 'POST' if post_data else 'GET'
+        if post_data:
+            headers['Content-Type'] = 'application/json'
+        if self.logger.isEnabledFor(logging.INFO):
+            header_str = ' '.join(['--header \'{}: {}\''.format(k, v) for k, v in headers.items()])
+            data_str = ' -d {}'.format(post_data) if post_data else ''
+            self.logger.info("curl -X %s %s%s %s" % (method, header_str, data_str, url))
+        bucket = self.rate_limits.get('broadcast' if post_data else 'read')
+        if bucket is not None and not bucket.acquire(timeout=timeout):
+            raise NetworkException('Failed to get response: deadline exceeded waiting for the rate limit')
+        limiter = self.concurrency_limiter
+        if limiter is not None and not limiter.acquire(deadline - time.time() if deadline else None):
+            raise NetworkException('Failed to get response: deadline exceeded waiting for a request slot')
+        if deadline:
+            timeout = max(deadline - time.time(), 0.001)
+        if on_sent is not None:
+            on_sent()
+        start = time.time()
+        received = 0
+        error = congested = True
         try:
-            if post_data:
-                headers['Content-Type'] = 'application/json'
-                data_str = '-d {}'.format(post_data)
-                self.logger.info("curl -X POST %s %s %s" % (header_str, data_str, url))
-                return requests.post(url, data=post_data, headers=headers).json()
-            else:
-                self.logger.info("curl -X GET %s %s" % (header_str, url))
-                return requests.get(url, headers=headers).json()
-        except RequestException as ex:
+            with span('network'):
+                if post_data:
+                    resp = requests.post(url, data=post_data, headers=headers, timeout=timeout)
+                else:
+                    resp = requests.get(url, headers=headers, timeout=timeout)
+                received = len(resp.content)
+            error = resp.status_code >= 400
+            # a 4xx is the caller's mistake, only transport failures and 5xx signal an overloaded node
+            congested = resp.status_code >= 500
+            try:
+                result = resp.json()
+            except ValueError:
+                msg = 'Failed to parse response: HTTP {} {}'.format(resp.status_code, resp.text[:200])
+                if resp.status_code >= 500:
+                    raise NetworkException(msg)
+                # a deterministic answer, e.g. a plain text 404, retrying it cannot help
+                raise InvalidResponseException(msg, resp.status_code)
+            if not post_data:
+                if resp.status_code >= 500:
+                    raise _ServerError(result)
+                self._latencies.append(time.time() - start)
+            return result
+        except requests.exceptions.RequestException as ex:
             msg = 'Failed to get response: {}'.format(ex)
             raise NetworkException(msg)
-
+        finally:
+            elapsed = time.time() - start
+            if limiter is not None:
+                limiter.release(elapsed, congested)
+            if self.metrics is not None:
+                self.metrics.observe(method, api, elapsed, len(post_data or ''), received, error)